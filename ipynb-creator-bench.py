@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+#
+# ipynb-creator-bench.py
+#
+# Benchmarks for ipynb_creator.py. Generates synthetic .txt and .py source
+# files and times each phase of the conversion separately:
+#   parse       process_text_file() reading and splitting the text file
+#   parse_mmap  the same with the mmap parser of --parser mmap
+#   insert      add_cell() of the parsed cells into an in memory notebook
+#   serialize   json encoding of the cells, as done by NotebookWriter
+#   json_BACKEND, json_BACKEND_compact
+#               the same with each installed --json-backend, with --indent 2
+#               and with --compact. The output of each backend is checked to
+#               be the same text as that of the stdlib json module.
+#   end_to_end  main_with_files() over a directory of files
+# Results are written as json so that a later run can be compared against a
+# stored baseline, failing if the throughput drops by more than a threshold.
+#
+# $ python3 ipynb-creator-bench.py run --output bench_baseline.json
+# $ python3 ipynb-creator-bench.py run --output bench_new.json
+# $ python3 ipynb-creator-bench.py compare bench_baseline.json bench_new.json
+#
+import sys
+import os
+import io
+import json
+import time
+import random
+import tempfile
+import contextlib
+import platform
+
+BENCH_FORMAT = 1
+
+# Each case: name, files, cells per file, lines per cell, and the fraction of
+# lines that are <comment> lines. Cell counts grow by 10x to show scaling.
+BENCH_CASES = [
+    ("cells-100", 1, 100, 10, 0.0),
+    ("cells-1000", 1, 1000, 10, 0.0),
+    ("cells-10000", 1, 10000, 10, 0.0),
+    ("large-cells", 1, 100, 1000, 0.0),
+    ("comments", 1, 1000, 10, 0.3),
+    ("files-200", 200, 20, 10, 0.1),
+]
+
+# --quick drops the largest cases for a fast check
+QUICK_CASES = ("cells-100", "cells-1000", "comments", "files-200")
+
+REPEAT = 3
+DEFAULT_THRESHOLD = 0.25
+
+HELP = """Usage: ipynb-creator-bench.py COMMAND [OPTION]...
+
+Commands:
+   run [--quick] [--output FILE] [--repeat N]
+            time each phase over the synthetic corpus and write the results
+            as json to FILE, default bench_results.json
+   compare BASELINE [RESULTS] [--threshold FRACTION]
+            compare RESULTS, default bench_results.json, with BASELINE.
+            Exits with status 1 if a throughput dropped by more than
+            FRACTION, default 0.25.
+"""
+
+
+def load_creator():
+    # Import ipynb_creator.py from the same directory as this file
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import ipynb_creator
+    return ipynb_creator
+
+
+def make_text_source(cell_total, cell_lines, comment_density, seed=0):
+    # Return the text of a delimited .txt file. Alternate markdown and code
+    # cells, using each of the delimiter forms given in the help text.
+    rng = random.Random(seed)
+    delimiters = {
+        "markdown": ("<markdown>\n", "< markdown >\n",
+                "<markdown A comment after the keyword>\n"),
+        "code": ("<code>\n", "< code >\n", "<code from hello_world.py>\n"),
+    }
+    parts = ["Text before the first delimiter is ignored.\n"]
+    for index in range(cell_total):
+        cell_type = "markdown" if index % 2 == 0 else "code"
+        parts.append(rng.choice(delimiters[cell_type]))
+        for line_index in range(cell_lines):
+            if rng.random() < comment_density:
+                parts.append("<comment line {} of cell {}>\n"
+                        .format(line_index, index))
+            if cell_type == "markdown":
+                parts.append("Line {} of *cell* {} with some more text.\n"
+                        .format(line_index, index))
+            else:
+                parts.append("value_{} = math.sqrt({}) * {}\n"
+                        .format(line_index, index, line_index))
+    return "".join(parts)
+
+
+def make_py_source(line_total, seed=0):
+    # Return the text of a python program with functions and comments
+    rng = random.Random(seed)
+    parts = ['"""Synthetic module for benchmarking."""\nimport math\n\n']
+    for index in range(line_total // 5):
+        parts.append("# Function number {}\n".format(index))
+        parts.append("def function_{}(a):\n".format(index))
+        parts.append("    b = a * {}\n".format(rng.randint(1, 99)))
+        parts.append("    return math.sqrt(b)\n\n")
+    return "".join(parts)
+
+
+def best_time(function, repeat):
+    # Return the shortest of repeat runs and the last result of function
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        seconds = time.perf_counter() - start
+        if best is None or seconds < best:
+            best = seconds
+    return best, result
+
+
+def get_backends():
+    # The --json-backend choices that are installed
+    backend_list = ["stdlib"]
+    for backend in ("simplejson", "orjson"):
+        try:
+            __import__(backend)
+        except ImportError:
+            continue
+        backend_list.append(backend)
+    return backend_list
+
+
+def bench_backends(creator, name, cells, repeat):
+    # Time the json encoding of the cells with each backend and format.
+    # Exits if a backend does not give the same text as the stdlib json.
+    data = creator.new_notebook()
+    for cell_type, source_lines in cells:
+        creator.add_cell(data, cell_type, source_lines)
+    results = []
+    for compact in (False, True):
+        expected = None
+        for backend in get_backends():
+            options = dict(creator.OPTION_DEFAULTS, json_backend=backend,
+                    indent=2, compact=compact)
+            dumps = creator.get_json_dumps(options)
+            seconds, text_list = best_time(
+                    lambda: [dumps(cell_dict) for cell_dict in data["cells"]],
+                    repeat)
+            if expected is None:
+                expected = text_list
+            elif text_list != expected:
+                sys.exit("The {} backend does not give the same json as "
+                        "stdlib.".format(backend))
+            phase = "json_" + backend + ("_compact" if compact else "")
+            results.append(make_result(name, phase, seconds, len(cells),
+                    sum(len(text) for text in text_list)))
+    return results
+
+
+def make_result(case, phase, seconds, cell_total, byte_total):
+    # One row of the results with the throughput of the phase
+    seconds = max(seconds, 1e-9)
+    return {
+        "case": case,
+        "phase": phase,
+        "seconds": round(seconds, 6),
+        "cells": cell_total,
+        "bytes": byte_total,
+        "cells_per_sec": round(cell_total / seconds, 1),
+        "mb_per_sec": round(byte_total / seconds / 1e6, 3),
+    }
+
+
+def bench_case(creator, directory, case, repeat):
+    # Time each phase of one case. Returns the list of result rows.
+    name, file_total, cell_total, cell_lines, comment_density = case
+    case_dir = os.path.join(directory, name)
+    os.mkdir(case_dir)
+    file_list = []
+    for index in range(file_total):
+        text = make_text_source(cell_total, cell_lines, comment_density, index)
+        file_name = os.path.join(case_dir, "source_{:05}.txt".format(index))
+        with open(file_name, "w") as f:
+            f.write(text)
+        file_list.append(file_name)
+    py_name = os.path.join(case_dir, "source_py.py")
+    with open(py_name, "w") as f:
+        f.write(make_py_source(cell_total * cell_lines))
+    file_list.append(py_name)
+    byte_total = sum(os.path.getsize(file_name) for file_name in file_list)
+    text_file = file_list[0]
+    text_bytes = os.path.getsize(text_file)
+
+    results = []
+    seconds, cells = best_time(
+            lambda: list(creator.process_text_file(text_file)), repeat)
+    results.append(make_result(name, "parse", seconds, len(cells), text_bytes))
+    seconds, _ = best_time(
+            lambda: list(creator.process_text_file(text_file, "mmap")), repeat)
+    results.append(make_result(name, "parse_mmap", seconds, len(cells),
+            text_bytes))
+
+    def insert():
+        data = creator.new_notebook()
+        for cell_type, source_lines in cells:
+            creator.add_cell(data, cell_type, source_lines)
+        return data
+    seconds, data = best_time(insert, repeat)
+    results.append(make_result(name, "insert", seconds, len(cells), text_bytes))
+
+    def serialize():
+        json_module = creator.load_json_module()
+        return sum(len(json_module.dumps(cell_dict, indent=1))
+                for cell_dict in data["cells"])
+    seconds, encoded_bytes = best_time(serialize, repeat)
+    results.append(make_result(name, "serialize", seconds, len(cells),
+            encoded_bytes))
+    results.extend(bench_backends(creator, name, cells, repeat))
+
+    options = dict(creator.OPTION_DEFAULTS)
+    def end_to_end():
+        with contextlib.redirect_stdout(io.StringIO()):
+            creator.main_with_files(file_list, options)
+    seconds, _ = best_time(end_to_end, repeat)
+    results.append(make_result(name, "end_to_end", seconds,
+            file_total * len(cells) + 2, byte_total))
+    return results
+
+
+def print_results(results):
+    print("{:<14} {:<20} {:>10} {:>9} {:>14} {:>10}".format(
+            "case", "phase", "seconds", "cells", "cells/sec", "MB/sec"))
+    for row in results:
+        print("{:<14} {:<20} {:>10.4f} {:>9} {:>14,.0f} {:>10.2f}".format(
+                row["case"], row["phase"], row["seconds"], row["cells"],
+                row["cells_per_sec"], row["mb_per_sec"]))
+
+
+def print_scaling(results):
+    # Time per cell of each phase for the cells-N cases, relative to the
+    # smallest case. Values near 1.0 mean the phase scales linearly.
+    rows = [row for row in results if row["case"].startswith("cells-")]
+    for phase in ("parse", "parse_mmap", "insert", "serialize", "end_to_end"):
+        phase_rows = sorted((row for row in rows if row["phase"] == phase),
+                key=lambda row: row["cells"])
+        if len(phase_rows) < 2:
+            continue
+        base = phase_rows[0]["seconds"] / phase_rows[0]["cells"]
+        ratios = ["{}: {:.2f}".format(row["case"],
+                row["seconds"] / row["cells"] / base) for row in phase_rows]
+        print("Scaling of {} time per cell. {}".format(phase,
+                ", ".join(ratios)))
+
+
+def run(arg_list):
+    output = "bench_results.json"
+    repeat = REPEAT
+    quick = False
+    arg_iter = iter(arg_list)
+    for arg in arg_iter:
+        if arg == "--quick":
+            quick = True
+        elif arg == "--output":
+            output = next(arg_iter, output)
+        elif arg == "--repeat":
+            repeat = int(next(arg_iter, repeat))
+        else:
+            sys.exit("Unknown argument {}.\n{}".format(arg, HELP))
+
+    creator = load_creator()
+    case_list = [case for case in BENCH_CASES
+            if not quick or case[0] in QUICK_CASES]
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for case in case_list:
+            print("Running {}...".format(case[0]), file=sys.stderr)
+            results.extend(bench_case(creator, directory, case, repeat))
+
+    print_results(results)
+    print()
+    print_scaling(results)
+    with open(output, "w") as f:
+        json.dump({
+            "format": BENCH_FORMAT,
+            "creator_version": creator.VERSION,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": repeat,
+            "results": results}, f, indent=1)
+    print("\nResults written to {}".format(output))
+
+
+def compare(arg_list):
+    threshold = DEFAULT_THRESHOLD
+    file_list = []
+    arg_iter = iter(arg_list)
+    for arg in arg_iter:
+        if arg == "--threshold":
+            threshold = float(next(arg_iter, threshold))
+        else:
+            file_list.append(arg)
+    if len(file_list) == 1:
+        file_list.append("bench_results.json")
+    if len(file_list) != 2:
+        sys.exit(HELP)
+
+    with open(file_list[0]) as f:
+        baseline = json.load(f)
+    with open(file_list[1]) as f:
+        current = json.load(f)
+    baseline_rows = {(row["case"], row["phase"]): row
+            for row in baseline["results"]}
+
+    regression_total = 0
+    print("{:<14} {:<20} {:>14} {:>14} {:>8}".format(
+            "case", "phase", "baseline", "current", "change"))
+    for row in current["results"]:
+        base_row = baseline_rows.get((row["case"], row["phase"]))
+        if base_row is None:
+            continue
+        change = row["cells_per_sec"] / base_row["cells_per_sec"] - 1
+        flag = ""
+        if change < -threshold:
+            flag = "  REGRESSION"
+            regression_total += 1
+        print("{:<14} {:<20} {:>14,.0f} {:>14,.0f} {:>+7.1%}{}".format(
+                row["case"], row["phase"], base_row["cells_per_sec"],
+                row["cells_per_sec"], change, flag))
+
+    if regression_total:
+        sys.exit("\n{} results are more than {:.0%} slower than the baseline."
+                .format(regression_total, threshold))
+    print("\nNo results are more than {:.0%} slower than the baseline."
+            .format(threshold))
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] in ("-h", "--help"):
+        print(HELP)
+        return
+    if sys.argv[1] == "run":
+        run(sys.argv[2:])
+    elif sys.argv[1] == "compare":
+        compare(sys.argv[2:])
+    else:
+        sys.exit("Unknown command {}.\n{}".format(sys.argv[1], HELP))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4745 @@
+#!/usr/bin/env python3
+#
+# ipynb_creator.py
+#
+# Reads a plain text file and creates an ipynb file.
+# Expects <> as the cell delimiters in the text file. Valid delimiters are:
+# <code>, <markdown>, <raw>
+# Comments, which are ignored may exist in the text file as:
+# <comment This is a comment>
+# 
+# Uses the title of the plain text file as the ipynb filename.
+#
+# The command is ipynb-creator.py which calls main(). This file may also be
+# imported as a library to convert strings without using files:
+#   import ipynb_creator
+#   data = ipynb_creator.convert_text(text)
+#   text = ipynb_creator.dumps_notebook(data)
+#
+# Ian Stewart
+# V0.1 - 2019-08-05
+#
+# V0.2 - 2019-08-06
+# Fixed some menu prompt text
+# Fixed if there are no .txt files in the directory.
+# Add ability to read python files.
+#   o Read to a code cell
+#   o Include Markdown header cell with program name.
+#
+# V0.3 - 2019-08-10
+# Fixed constants to be uppercase and moved out of the way to the bottom 
+# Pass filename(s) via command line arguments.
+# renamed ipynb_extractor to ipynb-extractor
+#
+# V0.4 - 2026-10-17
+# Build the notebook in memory and write the ipynb file once.
+# Stream the text file a line at a time, yielding each cell as it completes.
+# Cell source is stored as a list of lines.
+# Option --jobs N converts the files over a pool of N processes.
+# Option --incremental skips files that are unchanged since the last run.
+# Option --watch regenerates the ipynb file when a .txt or .py file changes.
+# Stream cells to a temporary file which replaces the ipynb file when done.
+# Option --recursive walks directories, optionally into an --output-dir.
+# Option --split-py splits python files into cells with one tokenize pass.
+# Option --extract writes .txt or .py files from ipynb files.
+# Split into the ipynb_creator.py library and the ipynb-creator.py command.
+# Option --serve runs a conversion server which --connect sends files to.
+# Option --parser mmap finds the delimiters with a regular expression.
+# Options --max-cells and --max-bytes shard large notebooks into parts.
+# Options --json-backend, --indent, --compact and --no-ensure-ascii.
+# Option --stats times each phase, --profile saves a cProfile profile.
+# Sources may be read from archives, --output-archive writes zip or tar.
+# A file argument of - converts stdin to stdout.
+# Option --update keeps the outputs of unchanged cells.
+# Delimiter <include path> inserts the cells or lines of another file.
+# Option --in-flight N overlaps the file I/O of N conversions on threads.
+# Option --execute runs the code cells on a pool of warm python kernels.
+# Option --validate checks notebooks against nbformat 4. Raw cells made.
+# Interactive mode pages and filters the files and picks several at once.
+#
+import sys
+import os
+import posixpath
+import re
+import ast
+import copy
+import difflib
+import fnmatch
+import functools
+import codecs
+import contextlib
+import hashlib
+import itertools
+import math
+import mmap
+import stat
+import struct
+import tempfile
+import tokenize
+import time
+import io
+import json
+
+VERSION = "0.4"
+
+HEADING_TXT = ("\nRead a text file and create an ipynb file." \
+            "\nText files (.txt) found in the current directory:")
+
+HEADING_PY =  ("\nRead a python file and create an ipynb file." \
+            "\nPython files (.py) found in the current directory:")
+
+# Command line options and their default values. The type of the default
+# sets how parse_options() reads the option: bool is a flag, which --no- in
+# front of its name turns off, int a number, list an option that may be
+# repeated.
+OPTION_DEFAULTS = {
+    "jobs": 1,
+    "incremental": False,
+    "force": False,
+    "clean_cache": False,
+    "watch": False,
+    "recursive": False,
+    "output_dir": "",
+    "include": [],
+    "exclude": [],
+    "split_py": "",
+    "extract": False,
+    "to": "txt",
+    "serve": "",
+    "connect": "",
+    "token": "",
+    "parser": "lines",
+    "max_cells": 0,
+    "max_bytes": 0,
+    "split_at_headings": False,
+    "json_backend": "auto",
+    "indent": 1,
+    "compact": False,
+    "ensure_ascii": True,
+    "stats": False,
+    "stats_format": "text",
+    "stats_file": "",
+    "profile": "",
+    "output_archive": "",
+    "type": "txt",
+    "name": "program",
+    "update": False,
+    "in_flight": 1,
+    "execute": False,
+    "kernels": 0,
+    "cell_timeout": 30,
+    "validate": False,
+    "validate_reference": False,
+}
+
+# The values accepted by options that have a fixed set of choices
+OPTION_CHOICES = {
+    "split_py": ("markers", "defs"),
+    "to": ("txt", "py"),
+    "type": ("txt", "py"),
+    "parser": ("lines", "mmap"),
+    "json_backend": ("auto", "stdlib", "simplejson", "orjson"),
+    "stats_format": ("text", "jsonl"),
+}
+
+# Options that change the content of the ipynb file. They are part of the
+# settings recorded in the build cache.
+OUTPUT_OPTIONS = ("split_py", "max_cells", "max_bytes", "split_at_headings",
+        "indent", "compact", "ensure_ascii", "execute")
+
+# parse_text_buffer(). A line that starts with "<", which is a delimiter or is
+# dropped, after the first line and as the first line. The encodings, as
+# named by codecs, that the mmap parser can read.
+TXT_DELIMITER = re.compile(rb"\n(<[^\n]*)")
+TXT_FIRST_DELIMITER = re.compile(rb"<[^\n]*")
+# A delimiter whose keyword is followed by a comment. The keyword is known
+# without decoding the line, as get_delimiter_keyword() would give the same.
+TXT_KEYWORD = re.compile(rb"<[ \t]*([a-z]+)[ \t]+[!-~]")
+MMAP_ENCODINGS = ("utf-8", "ascii", "latin-1", "iso8859-15", "cp1252")
+OTHER_LINE_BREAKS = "\v\f\x1c\x1d\x1e\x85\u2028\u2029"
+
+# parse_py_lines(). Cell markers "# %%" and "# In[ ]:", and the PEP 263
+# source encoding comment which stays as code.
+PY_MARKER = re.compile(r"#\s*(%%|In\s*\[[^\]]*\]\s*:?)(.*)")
+PY_CODING = re.compile(r"^[ \t\f]*#.*?coding[:=]")
+
+# Build cache used by --incremental. Kept in the current working directory.
+CACHE_FILENAME = ".ipynb-creator-cache.json"
+CACHE_FORMAT = 1
+CACHE_BLOCK_SIZE = 1 << 20
+
+FILE_MODE_CACHE = {}
+JSON_MODULE_CACHE = {}
+# get_json_dumps(). The encoder for each set of json options, and the
+# characters that --ensure-ascii escapes in the output of orjson.
+JSON_DUMPS_CACHE = {}
+# <include path>. The files read by IncludeReader, by real path, and the
+# sha256 of included files recorded in the build cache.
+INCLUDE_CACHE = {}
+INCLUDE_HASH_CACHE = {}
+# --execute. The KernelPool of this process, and the seconds a kernel may
+# take to start or reset, or to stop when closed.
+KERNEL_POOL_CACHE = {}
+KERNEL_START_TIMEOUT = 60
+JSON_NOT_ASCII = re.compile("[\x7f-\U0010ffff]")
+JSON_PLAIN_TYPES = {str, int, bool, type(None)}
+
+# JsonStream, used to extract the source from ipynb files
+JSON_CHUNK_SIZE = 1 << 16
+JSON_SPACE = re.compile(r"[ \t\n\r]*")
+JSON_STRING_SPECIAL = re.compile(r'["\\]')
+JSON_CONTAINER_SPECIAL = re.compile(r'["{}\[\]]')
+JSON_SCALAR_END = re.compile(r"[\s,\]}]")
+
+# --watch. Seconds without a change before converting, and the polling
+# interval used when inotify is not available.
+WATCH_DEBOUNCE = 0.3
+WATCH_POLL_INTERVAL = 0.5
+# inotify event mask bits and the size of struct inotify_event without name
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+INOTIFY_EVENT_SIZE = 16
+
+# --update. What an unchanged cell keeps from the existing notebook, for
+# every cell and for code cells only.
+UPDATE_CELL_KEYS = ("metadata", "attachments")
+UPDATE_CODE_CELL_KEYS = ("execution_count", "outputs")
+
+# The interactive mode. The files listed per page, and the .txt and .py
+# files of each directory, from one scan, kept until the directory changes.
+PICKER_PAGE_SIZE = 20
+DIRECTORY_INDEX_CACHE = {}
+
+# Sharded notebooks. The index notebook records in its metadata, under this
+# key, how many parts were written, so a later conversion that makes fewer
+# parts removes only those. A larger ipynb file is not an index.
+PARTS_METADATA_KEY = "ipynb_creator"
+PARTS_INDEX_MAX_SIZE = 1 << 22
+# The characters escaped with a backslash in the text of a markdown link
+MARKDOWN_SPECIAL = re.compile(r"([\\`*_\[\]<>])")
+
+# The file argument that reads the source from stdin and writes the notebook
+# to stdout
+STDIO_NAME = "-"
+
+# --validate. The nbformat 4 schema as tables. The required and the optional
+# keys of each cell type and output type. From nbformat 4.5 each cell also
+# requires an "id". The types of the cell metadata keys that the schema
+# defines, other keys may hold anything. The notebook metadata objects and
+# their required strings.
+NBFORMAT_MINOR = 2
+NBFORMAT_CELL_KEYS = {
+    "markdown": (("cell_type", "metadata", "source"), ("attachments",)),
+    "code": (("cell_type", "execution_count", "metadata", "outputs",
+            "source"), ()),
+    "raw": (("cell_type", "metadata", "source"), ("attachments",)),
+}
+NBFORMAT_OUTPUT_KEYS = {
+    "execute_result": (("data", "execution_count", "metadata",
+            "output_type"), ()),
+    "display_data": (("data", "metadata", "output_type"), ("transient",)),
+    "stream": (("name", "output_type", "text"), ()),
+    "error": (("ename", "evalue", "output_type", "traceback"), ()),
+}
+NBFORMAT_CELL_ID = re.compile(r"[a-zA-Z0-9_-]{1,64}\Z")
+NBFORMAT_CELL_METADATA = {
+    "name": lambda value: isinstance(value, str),
+    "tags": lambda value: isinstance(value, list) and all(isinstance(tag,
+            str) for tag in value),
+    "collapsed": lambda value: isinstance(value, bool),
+    "scrolled": lambda value: isinstance(value, bool) or value == "auto",
+    "trusted": lambda value: isinstance(value, bool),
+    "jupyter": lambda value: isinstance(value, dict),
+    "execution": lambda value: isinstance(value, dict),
+    "format": lambda value: isinstance(value, str),
+}
+NBFORMAT_METADATA_KEYS = {
+    "kernelspec": ("name", "display_name"),
+    "language_info": ("name",),
+}
+VALIDATE_MAX_ERRORS = 20
+
+# The format of a raw cell, a mime type, as in <raw text/restructuredtext>
+RAW_FORMAT = re.compile(r"[\w.+-]+/[\w.+-]+\Z")
+
+# Archives that sources may be read from and --output-archive written to.
+# Longer extensions first, so ".tar.gz" is found before ".gz" would be. The
+# size above which a notebook being added to an archive is spooled to disk.
+ARCHIVE_EXTENSIONS = (".tar.bz2", ".tar.gz", ".tar.xz", ".tbz2", ".tgz",
+        ".txz", ".tar", ".zip")
+TAR_WRITE_MODES = {".tar": "w", ".tar.gz": "w:gz", ".tgz": "w:gz",
+        ".tar.bz2": "w:bz2", ".tbz2": "w:bz2", ".tar.xz": "w:xz",
+        ".txz": "w:xz"}
+ARCHIVE_SPOOL_SIZE = 1 << 22
+
+# --stats. The phases of a conversion, in the order they happen. The number
+# of the slowest files listed in the summary.
+STATS_PHASES = ("read", "parse", "build", "execute", "serialize", "write")
+STATS_SLOWEST = 5
+STATS_END = object()
+NULL_CONTEXT = contextlib.nullcontext()
+
+# --serve. Requests that may wait for a worker, per worker, and the seconds a
+# request waits before the server answers 503 busy. The largest request body.
+SERVE_QUEUE_PER_JOB = 4
+SERVE_QUEUE_TIMEOUT = 30
+SERVE_MAX_BODY = 64 << 20
+# The header of the token a --serve server on TCP requires. Any web page may
+# send requests to localhost, but it can not read the token.
+SERVE_TOKEN_HEADER = "X-Ipynb-Creator-Token"
+# The options a --connect client may set for POST /files. --execute is not
+# one of them, as it would run the code of the files in the server.
+SERVE_OPTIONS = tuple(key for key in OUTPUT_OPTIONS if key != "execute") + (
+        "parser", "json_backend", "stats", "update", "validate")
+
+def query_user_bool(prompt="Proceed?", default=True,):
+    # Submit a boolean query to the User. Return True or False
+    # No need for a while loop
+    yes_tuple = ("y", "t", "1")
+    no_tuple = ("n", "f", "0")
+    # Build the prompt as [Y/n] or [N/y]
+    if default:
+        prompt = prompt + " [Y/n]: " 
+        response = input(prompt)
+        if response == "": response = "y"
+        if response.lower()[0] in yes_tuple:
+            return True
+        else:
+            return False
+    else:
+        prompt = prompt + " [N/y]: "
+        response = input(prompt)
+        if response == "": response = "n"
+        if response.lower()[0] in no_tuple:
+            return False
+        else:
+            return True
+
+
+def get_directory_index(directory=os.curdir):
+    # The names of the .txt and .py files in the directory, sorted, from one
+    # os.scandir. Kept in DIRECTORY_INDEX_CACHE and reused by each prompt
+    # until the directory's mtime changes, as it does when a file is added,
+    # removed or renamed.
+    path = os.path.abspath(directory)
+    mtime = os.stat(path).st_mtime_ns
+    cached = DIRECTORY_INDEX_CACHE.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with os.scandir(path) as it:
+        name_list = sorted(entry.name for entry in it
+                if has_extension(entry.name, ("txt", "py"))
+                and entry.is_file())
+    DIRECTORY_INDEX_CACHE[path] = (mtime, name_list)
+    return name_list
+
+
+def get_text_file_list(extension):
+    # The files in the current working directory with the extension
+    return [file_name for file_name in get_directory_index()
+            if has_extension(file_name, (extension,))]
+
+
+def has_extension(file_name, extension_tuple):
+    # True if the file name ends with one of the extensions. E.g. ("txt", "py")
+    return file_name.split(".")[-1] in extension_tuple
+
+
+def query_user_menu(menu_list, prompt=None, default=1):
+    # User selects from a list. Return an index into the list
+    if len(menu_list) == 0:
+        return -1
+    print()
+    for index, item in enumerate(menu_list):
+        print("{:>3}. {}".format(index + 1, item))
+    if prompt == None:
+        prompt = ("\nEnter the number of the item [{}]: "
+                .format(default))
+    else:
+        prompt = ("\n{} [{}]: ".format(prompt, default))
+
+    while True:     
+        response = input(prompt)
+        if response == "": response = default
+        try:
+            response = int(response)
+            if response < 1 or response > len(menu_list):
+                print("Invalid.  Requires a value between {} and {}"
+                    .format(1, len(menu_list)))
+                continue
+            else:
+                return response - 1
+        except ValueError as e:
+            print("Value Error. Requires a value between {} and {}"
+                    .format(1, len(menu_list)))
+            continue
+
+
+def parse_selection(text, total):
+    # The indexes into a list of total items chosen by text, such as
+    # "1-20,35". Numbers start at 1. Returned in the order given, without
+    # repeats. Raises ValueError for text that is not a valid selection.
+    index_list = []
+    for part in text.replace(" ", "").split(","):
+        first, dash, last = part.partition("-")
+        try:
+            start = int(first)
+            end = int(last) if dash else start
+        except ValueError:
+            start = end = 0
+        if start < 1 or end > total or start > end:
+            raise ValueError("{} is not a number or range between 1 and {}"
+                    .format(part, total))
+        index_list.extend(range(start - 1, end))
+    return list(dict.fromkeys(index_list))
+
+
+def is_fuzzy_match(query, name):
+    # True if the letters of query are in name in the same order. E.g. "lsn3"
+    # matches "lesson_3.txt"
+    letters = iter(name)
+    return all(letter in letters for letter in query)
+
+
+class FilePicker:
+    # The interactive choice of files from a list that may hold tens of
+    # thousands. Only one page is shown at a time. Typing /text filters the
+    # list: names that hold text come first, then the fuzzy matches. A
+    # filter that extends the last one only searches the last matches.
+    # Numbers and ranges, e.g. 1-20,35, pick the files shown by the filter.
+
+    def __init__(self, name_list, page_size=PICKER_PAGE_SIZE):
+        self.name_list = name_list
+        self.page_size = page_size
+        self.query = ""
+        self.match_list = name_list
+        self.page = 0
+
+    def filter(self, query):
+        # Show the files that match query, "" for all of them
+        query = query.lower()
+        if query.startswith(self.query) and self.query:
+            candidates = self.match_list
+        else:
+            candidates = self.name_list
+        if not query:
+            self.match_list = self.name_list
+        else:
+            lower_list = [(name, name.lower()) for name in candidates]
+            self.match_list = ([name for name, lower in lower_list
+                    if query in lower]
+                    + [name for name, lower in lower_list
+                    if query not in lower and is_fuzzy_match(query, lower)])
+        self.query = query
+        self.page = 0
+
+    def get_page_total(self):
+        return max(1, -(-len(self.match_list) // self.page_size))
+
+    def turn(self, step):
+        # Move to the next page, or the previous with a step of -1
+        self.page = min(max(self.page + step, 0), self.get_page_total() - 1)
+
+    def show(self):
+        # Print the page of files being shown, numbered within the matches
+        start = self.page * self.page_size
+        print()
+        for index, name in enumerate(self.match_list[start:start
+                + self.page_size], start + 1):
+            print("{:>6}. {}".format(index, name))
+        matching = " matching '{}'".format(self.query) if self.query else ""
+        print("Page {} of {}, {} files{}.".format(self.page + 1,
+                self.get_page_total(), len(self.match_list), matching))
+
+    def select(self, text):
+        # The names chosen by text, e.g. "1-20,35" or "*" for all matches
+        if text == "*":
+            return list(self.match_list)
+        return [self.match_list[index]
+                for index in parse_selection(text, len(self.match_list))]
+
+
+def pick_files(name_list, prompt, default=1):
+    # Ask the user to choose one or more of the files in name_list. Returns
+    # the names chosen. Empty if there are no files.
+    if len(name_list) == 0:
+        return []
+    picker = FilePicker(name_list)
+    help_text = ("{} [{}]\n  Numbers or ranges, e.g. 1-20,35, or * for all "
+            "shown. /text filters, / shows all.\n  n and p for the next and "
+            "previous page, q to quit: ".format(prompt, default))
+    picker.show()
+    while True:
+        response = input("\n" + help_text).strip()
+        if response == "":
+            response = str(default)
+        if response.lower() == "q":
+            sys.exit("No file selected. Exiting")
+        if response.lower() in ("n", "p"):
+            picker.turn(1 if response.lower() == "n" else -1)
+            picker.show()
+            continue
+        if response.startswith("/"):
+            picker.filter(response[1:].strip())
+            picker.show()
+            continue
+        try:
+            selected = picker.select(response)
+        except ValueError as e:
+            print("Invalid. {}.".format(e))
+            continue
+        if selected:
+            return selected
+        print("No files match.")
+
+
+def format_selection(name_list):
+    # The files chosen, or their number if more than fill a page
+    if len(name_list) > PICKER_PAGE_SIZE:
+        return "{} files".format(len(name_list))
+    return ", ".join(name_list)
+
+
+def select_files(extension):
+    # Select the files to create ipynb files from
+    text_list = get_text_file_list(extension)
+
+    prompt = "Select the files for creating the ipynb files"
+    selected = pick_files(text_list, prompt)
+    # If no files with extension type were found then [] is returned
+    if len(selected) == 0:
+        sys.exit("No files with extension of .{} were found. Exiting"
+                .format(extension))
+    return selected
+
+
+def get_ipynb_filename(file_text):
+    # The ipynb file is in the same directory as the file it is created from
+    directory, filename = os.path.split(file_text)
+    filename = filename.split(".")[0]
+    filename = filename + ".ipynb"    
+    return os.path.join(directory, filename)
+
+
+def load_json_module():
+    # The json module used to write notebooks. simplejson, if installed, is
+    # imported on first use rather than when this file is imported.
+    if "module" not in JSON_MODULE_CACHE:
+        try:
+            import simplejson
+            JSON_MODULE_CACHE["module"] = simplejson
+        except ImportError:
+            JSON_MODULE_CACHE["module"] = json
+    return JSON_MODULE_CACHE["module"]
+
+
+def get_options(options=None):
+    # Library use. The options a caller passed, which may set only some of
+    # them, over OPTION_DEFAULTS. E.g. {"compact": True}
+    if options is None:
+        return OPTION_DEFAULTS
+    return dict(OPTION_DEFAULTS, **options)
+
+
+def get_json_dumps(options=None):
+    # Return a function that encodes a value as json text, using the backend
+    # and format of the --json-backend, --indent, --compact and
+    # --ensure-ascii options. The default, with no options, is the json of
+    # load_json_module() with indent=1. Every backend gives the same text for
+    # the same format, strings escaped alike, except that orjson writes the
+    # exponent of a float without "+" or a leading 0, e.g. 1e100 for 1e+100,
+    # which is the same number. Raises ImportError if the backend is not installed
+    # and ValueError for a format it can not write.
+    options = get_options(options)
+    key = (options["json_backend"], options["indent"], options["compact"],
+            options["ensure_ascii"])
+    if key in JSON_DUMPS_CACHE:
+        return JSON_DUMPS_CACHE[key]
+    backend, indent, compact, ensure_ascii = key
+    if compact:
+        indent = None
+
+    if backend == "orjson":
+        import orjson
+        if indent is None:
+            option = 0
+        elif indent == 2:
+            option = orjson.OPT_INDENT_2
+        else:
+            raise ValueError("orjson only writes --indent 2 or --compact.")
+
+        # NaN and infinity are not json. orjson writes them as null, which
+        # changes the data, so a value that holds them is written as the
+        # standard library writes it.
+        stdlib_dumps = functools.partial(json.dumps, indent=indent,
+                separators=(",", ":") if compact else (",", ": "),
+                ensure_ascii=ensure_ascii)
+
+        def dumps(value):
+            if has_non_finite_float(value):
+                return stdlib_dumps(value)
+            # orjson writes utf-8 bytes and never escapes non-ascii
+            text = orjson.dumps(value, option=option).decode("utf-8")
+            if ensure_ascii and not text.isascii():
+                text = JSON_NOT_ASCII.sub(escape_json_character, text)
+            return text
+    else:
+        if backend == "stdlib":
+            json_module = json
+        elif backend == "simplejson":
+            import simplejson as json_module
+        else:
+            json_module = load_json_module()
+        separators = (",", ":") if compact else (",", ": ")
+        dumps = functools.partial(json_module.dumps, indent=indent,
+                separators=separators, ensure_ascii=ensure_ascii)
+    JSON_DUMPS_CACHE[key] = dumps
+    return dumps
+
+
+def has_non_finite_float(value):
+    # True if the value holds a float that is NaN or infinite. The "source"
+    # of a cell is text, and is not looked at. A list or object whose items
+    # are all strings, ints or None is checked without a python loop.
+    if isinstance(value, float):
+        return not math.isfinite(value)
+    if isinstance(value, dict):
+        value = [item for key, item in value.items() if key != "source"]
+    elif not isinstance(value, list):
+        return False
+    if set(map(type, value)) <= JSON_PLAIN_TYPES:
+        return False
+    return any(has_non_finite_float(item) for item in value)
+
+
+def escape_json_character(match):
+    # The json escape of a character, as json.dumps() with ensure_ascii
+    # writes it. Characters outside the Basic Multilingual Plane are written
+    # as a surrogate pair.
+    code = ord(match.group())
+    if code < 0x10000:
+        return "\\u{:04x}".format(code)
+    code -= 0x10000
+    return "\\u{:04x}\\u{:04x}".format(0xd800 | (code >> 10),
+            0xdc00 | (code & 0x3ff))
+
+
+def get_text_size(text):
+    # The size in bytes of the text written as utf-8
+    if text.isascii():
+        return len(text)
+    return len(text.encode("utf-8"))
+
+
+def check_json_options(options):
+    # Exit with a message if the json options can not be used together
+    try:
+        get_json_dumps(options)
+    except ImportError:
+        sys.exit("--json-backend {0} requires the {0} module to be installed."
+                .format(options["json_backend"]))
+    except ValueError as e:
+        sys.exit(str(e))
+
+
+def new_notebook(metadata=None):
+    # Return an empty notebook as a dictionary. Cells may be added in memory
+    # with add_cell(), or streamed to a file with NotebookWriter. metadata is
+    # added to the notebook metadata.
+    data = {}
+    data.update({
+            "cells": [],
+            "metadata": copy.deepcopy(NOTEBOOK_METADATA),
+            "nbformat": 4,
+            "nbformat_minor": NBFORMAT_MINOR})
+    if metadata:
+        data["metadata"].update(metadata)
+    return data
+
+
+def get_heading_text(ipynb_filename):
+    # Heading for the markdown cell 0 of a notebook created from a python file
+    info_list = os.path.basename(ipynb_filename).split(".")
+    #info = "# " + info_list[0] + "\n\nCreated from a python file."
+    info = ("# {}\n\nCreated from the python file: {}.py"
+                .format(info_list[0], info_list[0]))
+    return info
+
+
+def get_file_mode(file_name):
+    # Permissions for a new file: those of the file being replaced, otherwise
+    # the same as open() would give a new file.
+    try:
+        return stat.S_IMODE(os.stat(file_name).st_mode)
+    except FileNotFoundError:
+        pass
+    return 0o666 & ~get_umask()
+
+
+def get_umask():
+    # The umask of the process. It can only be read by setting it, so it is
+    # read once, before any threads of --in-flight are started.
+    if "umask" not in FILE_MODE_CACHE:
+        umask = os.umask(0)
+        os.umask(umask)
+        FILE_MODE_CACHE["umask"] = umask
+    return FILE_MODE_CACHE["umask"]
+
+
+def create_temp_file(file_name, encoding=None, mode="w"):
+    # Open a temporary file, in the directory of file_name, to be renamed over
+    # file_name by finish_temp_file(). Returns the file and its name.
+    directory, base_name = os.path.split(file_name)
+    fd, temp_filename = tempfile.mkstemp(prefix="." + base_name + ".",
+            suffix=".tmp", dir=directory or ".")
+    return os.fdopen(fd, mode, encoding=encoding), temp_filename
+
+
+def finish_temp_file(f, temp_filename, file_name):
+    # Flush the temporary file to disk and rename it over file_name
+    f.flush()
+    os.fsync(f.fileno())
+    f.close()
+    os.chmod(temp_filename, get_file_mode(file_name))
+    os.replace(temp_filename, file_name)
+
+
+def discard_temp_file(f, temp_filename):
+    # Close and remove the temporary file
+    f.close()
+    try:
+        os.remove(temp_filename)
+    except FileNotFoundError:
+        pass
+
+
+def is_multiline_string(value):
+    # nbformat text: a string, or a list of strings to be joined
+    return isinstance(value, str) or (isinstance(value, list)
+            and all(isinstance(line, str) for line in value))
+
+
+def is_count(value):
+    # A non-negative int. bool is an int to python but not to json schema.
+    return (isinstance(value, int) and not isinstance(value, bool)
+            and value >= 0)
+
+
+def check_keys(value, required, optional, errors):
+    # Add an error for each required key that is missing and each key that
+    # is not allowed. required and optional are from NBFORMAT_CELL_KEYS or
+    # NBFORMAT_OUTPUT_KEYS.
+    for key in required:
+        if key not in value:
+            errors.append("'{}' is required".format(key))
+    for key in value:
+        if key not in required and key not in optional:
+            errors.append("'{}' is not allowed".format(key))
+
+
+def check_mimebundle(bundle, name, errors):
+    # The data of an output or attachment. Keys are mime types. The values
+    # are text, except for json types which may be any json.
+    if not isinstance(bundle, dict):
+        errors.append("'{}' must be an object".format(name))
+        return
+    for mime_type, value in bundle.items():
+        if "/" not in mime_type:
+            errors.append("'{}' key {!r} is not a mime type".format(name,
+                    mime_type))
+        elif not mime_type.endswith("json") and not is_multiline_string(
+                value):
+            errors.append("'{}' value of {} must be text".format(name,
+                    mime_type))
+
+
+def check_output(output, errors):
+    # Add the errors of one output of a code cell
+    if not isinstance(output, dict):
+        errors.append("an output must be an object")
+        return
+    output_type = output.get("output_type")
+    if output_type not in NBFORMAT_OUTPUT_KEYS:
+        errors.append("unknown output_type {!r}".format(output_type))
+        return
+    check_keys(output, *NBFORMAT_OUTPUT_KEYS[output_type], errors=errors)
+    if "data" in output:
+        check_mimebundle(output["data"], "data", errors)
+    if "metadata" in output and not isinstance(output["metadata"], dict):
+        errors.append("output 'metadata' must be an object")
+    if "execution_count" in output and not (output["execution_count"] is None
+            or is_count(output["execution_count"])):
+        errors.append("output 'execution_count' must be null or a count")
+    if output_type == "stream":
+        if not isinstance(output.get("name"), str):
+            errors.append("stream 'name' must be a string")
+        if not is_multiline_string(output.get("text", "")):
+            errors.append("stream 'text' must be text")
+    elif output_type == "error":
+        for key in ("ename", "evalue"):
+            if not isinstance(output.get(key, ""), str):
+                errors.append("error '{}' must be a string".format(key))
+        traceback_lines = output.get("traceback", [])
+        if not (isinstance(traceback_lines, list) and all(isinstance(line,
+                str) for line in traceback_lines)):
+            errors.append("error 'traceback' must be a list of strings")
+
+
+def validate_cell(cell_dict, nbformat_minor=NBFORMAT_MINOR):
+    # The errors of one cell against the nbformat 4 schema, as a list of
+    # messages. The keys allowed for each cell type are the tables in
+    # NBFORMAT_CELL_KEYS, so a valid cell costs a few dictionary lookups.
+    if not isinstance(cell_dict, dict):
+        return ["a cell must be an object"]
+    cell_type = cell_dict.get("cell_type")
+    if cell_type not in NBFORMAT_CELL_KEYS:
+        return ["unknown cell_type {!r}".format(cell_type)]
+    errors = []
+    required, optional = NBFORMAT_CELL_KEYS[cell_type]
+    if nbformat_minor >= 5:
+        required = required + ("id",)
+    check_keys(cell_dict, required, optional, errors)
+    if "id" in cell_dict and not (isinstance(cell_dict["id"], str)
+            and NBFORMAT_CELL_ID.match(cell_dict["id"])):
+        errors.append("'id' must be 1 to 64 letters, digits, - or _")
+    if "source" in cell_dict and not is_multiline_string(cell_dict["source"]):
+        errors.append("'source' must be a string or a list of strings")
+    metadata = cell_dict.get("metadata", {})
+    if not isinstance(metadata, dict):
+        errors.append("'metadata' must be an object")
+    else:
+        for key, value in metadata.items():
+            check = NBFORMAT_CELL_METADATA.get(key)
+            if check is not None and not check(value):
+                errors.append("metadata '{}' has the wrong type".format(key))
+    if "attachments" in cell_dict:
+        attachments = cell_dict["attachments"]
+        if not isinstance(attachments, dict):
+            errors.append("'attachments' must be an object")
+        else:
+            for bundle in attachments.values():
+                check_mimebundle(bundle, "attachments", errors)
+    if cell_type == "code":
+        if "execution_count" in cell_dict and not (
+                cell_dict["execution_count"] is None
+                or is_count(cell_dict["execution_count"])):
+            errors.append("'execution_count' must be null or a count")
+        outputs = cell_dict.get("outputs", [])
+        if not isinstance(outputs, list):
+            errors.append("'outputs' must be a list")
+        else:
+            for output in outputs:
+                check_output(output, errors)
+    return errors
+
+
+def validate_notebook_header(data):
+    # The errors of the notebook outside of its cells: the top level keys
+    # and the notebook metadata
+    if not isinstance(data, dict):
+        return ["the notebook must be an object"]
+    errors = []
+    check_keys(data, ("cells", "metadata", "nbformat", "nbformat_minor"), (),
+            errors)
+    if data.get("nbformat", 4) != 4:
+        errors.append("'nbformat' must be 4")
+    if not is_count(data.get("nbformat_minor", 0)):
+        errors.append("'nbformat_minor' must be a count")
+    if not isinstance(data.get("cells", []), list):
+        errors.append("'cells' must be a list")
+    metadata = data.get("metadata", {})
+    if not isinstance(metadata, dict):
+        errors.append("'metadata' must be an object")
+        return errors
+    for key, required in NBFORMAT_METADATA_KEYS.items():
+        value = metadata.get(key)
+        if value is None:
+            continue
+        if not isinstance(value, dict):
+            errors.append("metadata '{}' must be an object".format(key))
+            continue
+        for required_key in required:
+            if not isinstance(value.get(required_key), str):
+                errors.append("metadata '{}' needs the string '{}'"
+                        .format(key, required_key))
+    return errors
+
+
+def decode_notebook(text):
+    # Decode the text of an ipynb file. Returns the notebook, as json.loads()
+    # would, and the line number of each cell in the text. The cells are
+    # found by walking the top level object, and each cell is decoded by
+    # the json module. Raises ValueError for text that is not json.
+    decoder = json.JSONDecoder()
+    try:
+        position = JSON_SPACE.match(text).end()
+        if text[position] != "{":
+            return json.loads(text), []
+        data = {}
+        cell_lines = []
+        line = 1
+        line_position = 0
+        position = JSON_SPACE.match(text, position + 1).end()
+        while text[position] != "}":
+            if text[position] != '"':
+                raise ValueError
+            key, position = json.decoder.scanstring(text, position + 1)
+            position = JSON_SPACE.match(text, position).end()
+            if text[position] != ":":
+                raise ValueError
+            position = JSON_SPACE.match(text, position + 1).end()
+            if key == "cells" and text[position] == "[":
+                value = []
+                position = JSON_SPACE.match(text, position + 1).end()
+                while text[position] != "]":
+                    line += text.count("\n", line_position, position)
+                    line_position = position
+                    cell_lines.append(line)
+                    cell_dict, position = decoder.raw_decode(text, position)
+                    value.append(cell_dict)
+                    position = JSON_SPACE.match(text, position).end()
+                    if text[position] == ",":
+                        position = JSON_SPACE.match(text, position + 1).end()
+                    elif text[position] != "]":
+                        raise ValueError
+                position += 1
+            else:
+                value, position = decoder.raw_decode(text, position)
+            data[key] = value
+            position = JSON_SPACE.match(text, position).end()
+            if text[position] == ",":
+                position = JSON_SPACE.match(text, position + 1).end()
+            elif text[position] != "}":
+                raise ValueError
+        if JSON_SPACE.match(text, position + 1).end() != len(text):
+            raise ValueError
+    except (ValueError, IndexError):
+        # json.loads() raises the error, with its line and column
+        return json.loads(text), []
+    return data, cell_lines
+
+
+def validate_ipynb_file(ipynb_filename, reference=False):
+    # The errors of an ipynb file, each with the cell and its line number.
+    # With reference the notebook is also checked by the nbformat package,
+    # and a difference between the two is reported.
+    with open(ipynb_filename, "r", encoding="utf-8") as f:
+        text = f.read()
+    try:
+        data, cell_lines = decode_notebook(text)
+    except ValueError as e:
+        return ["not valid json: {}".format(e)]
+    errors = ["notebook: {}".format(message)
+            for message in validate_notebook_header(data)]
+    if isinstance(data, dict) and isinstance(data.get("cells"), list):
+        nbformat_minor = data.get("nbformat_minor")
+        if not is_count(nbformat_minor):
+            nbformat_minor = NBFORMAT_MINOR
+        for index, cell_dict in enumerate(data["cells"]):
+            for message in validate_cell(cell_dict, nbformat_minor):
+                if index < len(cell_lines):
+                    errors.append("cell {} (line {}): {}".format(index + 1,
+                            cell_lines[index], message))
+                else:
+                    errors.append("cell {}: {}".format(index + 1, message))
+    if reference:
+        # Imported here, as only --validate-reference needs it
+        import nbformat
+        try:
+            nbformat.validate(data, version=4)
+            reference_error = None
+        except nbformat.ValidationError as e:
+            reference_error = str(e).splitlines()[0]
+        if reference_error is not None and not errors:
+            errors.append("nbformat reference: {}".format(reference_error))
+        elif reference_error is None and errors:
+            errors.append("nbformat reference finds the notebook valid")
+    return errors
+
+
+def validate_file_job(job):
+    # Runs in a worker process of --validate --jobs. job is (ipynb_filename,
+    # reference). Returns the file name and its errors.
+    ipynb_filename, reference = job
+    try:
+        return ipynb_filename, validate_ipynb_file(ipynb_filename, reference)
+    except (OSError, UnicodeDecodeError) as e:
+        return ipynb_filename, ["{}: {}".format(type(e).__name__, e)]
+
+
+def main_validate_files(file_list, options):
+    # --validate with ipynb files. Check each notebook and print its errors.
+    # Nothing is written. Exits with status 1 if any notebook is not valid.
+    jobs = options["jobs"] or os.cpu_count() or 1
+    job_list = [(file_name, options["validate_reference"])
+            for file_name in file_list]
+    if jobs > 1:
+        # Imported here, as only --jobs needs it
+        import concurrent.futures
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=jobs)
+        results = executor.map(validate_file_job, job_list,
+                chunksize=get_chunksize(len(job_list), jobs))
+    else:
+        executor = None
+        results = map(validate_file_job, job_list)
+    invalid_total = 0
+    try:
+        for file_name, errors in results:
+            if not errors:
+                continue
+            invalid_total += 1
+            print("{} is not valid:".format(file_name))
+            for message in errors[:VALIDATE_MAX_ERRORS]:
+                print("   {}".format(message))
+            if len(errors) > VALIDATE_MAX_ERRORS:
+                print("   and {} more errors".format(len(errors)
+                        - VALIDATE_MAX_ERRORS))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    print("\n{} of {} notebooks are valid.".format(
+            len(file_list) - invalid_total, len(file_list)))
+    if invalid_total:
+        sys.exit(1)
+
+
+class NotebookWriter:
+    # Write a notebook to an ipynb file one cell at a time. The notebook
+    # header is written first, then each cell as it is added, then the
+    # metadata trailer. Output is the same as json.dump(data, f, indent=1) of
+    # the whole notebook, or the format set by the --json-backend, --indent,
+    # --compact and --ensure-ascii options, but only one cell is held in
+    # memory. The notebook is written to a temporary file in the same
+    # directory which on close() is flushed to disk and renamed over
+    # ipynb_filename. A reader sees either the old file or the complete new
+    # one, never part of a file. With an ArchiveOutput the notebook is
+    # instead added to the archive as ipynb_filename on close(). An
+    # ipynb_filename of "-" writes to stdout, flushed after each cell so a
+    # reader in a pipeline gets the cells as they are made. With --validate
+    # each cell is checked as it is added, and close() raises ValueError
+    # rather than write a notebook that is not valid.
+    #
+    # with NotebookWriter("hello.ipynb") as writer:
+    #     writer.add_cell(new_code_cell(["print(1)"]))
+
+    def __init__(self, ipynb_filename, options=None, stats=None,
+            archive=None, metadata=None):
+        options = get_options(options)
+        self.ipynb_filename = ipynb_filename
+        self.archive = archive
+        self.cell_total = 0
+        self.dumps = get_json_dumps(options)
+        # --stats. Time the serialize and write phases and count the cells.
+        self.stats = stats
+        self.phase = stats.phase if stats is not None else null_phase
+        # Split an empty notebook where the cells go, giving header and trailer
+        empty_cells = self.dumps({"cells": []})[1:-1].strip()
+        text = self.dumps(new_notebook(metadata))
+        self.header, self.trailer = text.split(empty_cells, 1)
+        self.header += empty_cells[:-1]
+        # The cells are 2 levels deep. Each line of a cell is indented by
+        # twice the indent. Compact json has no newlines.
+        if options["compact"]:
+            self.newline = ""
+            self.closing = "]"
+        else:
+            indent = options["indent"]
+            self.newline = "\n" + " " * (2 * indent)
+            self.closing = "\n" + " " * indent + "]"
+        self.to_stdout = ipynb_filename == STDIO_NAME
+        # --validate. The errors found and the line the next cell is on.
+        self.validate = options["validate"]
+        self.errors = []
+        if self.validate:
+            self.errors = ["notebook: {}".format(message)
+                    for message in validate_notebook_header(
+                    new_notebook(metadata))]
+            self.line = self.header.count("\n") + 1
+        with self.phase("write"):
+            if self.to_stdout:
+                sys.stdout.flush()
+                self.f = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8")
+            elif archive is None:
+                self.f, self.temp_filename = create_temp_file(ipynb_filename,
+                        "utf-8")
+            else:
+                self.f = archive.create_entry()
+            self.f.write(self.header)
+            if self.to_stdout:
+                self.f.flush()
+        self.byte_total = get_text_size(self.header)
+
+    def encode_cell(self, cell_dict):
+        # The text of the cell as add_cell() writes it, indented to its depth.
+        # json escapes newlines within strings so every newline is a line end.
+        with self.phase("serialize"):
+            text = self.dumps(cell_dict)
+            if self.newline:
+                text = text.replace("\n", self.newline)
+        return text
+
+    def get_separator(self):
+        # What is written before the next cell
+        if self.cell_total == 0:
+            return self.newline
+        return "," + self.newline
+
+    def add_cell(self, cell_dict, text=None):
+        # Add a cell. text is from encode_cell(), if it was already called.
+        if text is None:
+            text = self.encode_cell(cell_dict)
+        separator = self.get_separator()
+        if self.validate:
+            self.check_cell(cell_dict, separator, text)
+        with self.phase("write"):
+            self.f.write(separator)
+            self.f.write(text)
+            if self.to_stdout:
+                self.f.flush()
+        self.cell_total += 1
+        self.byte_total += len(separator) + get_text_size(text)
+        if self.stats is not None:
+            self.stats.count_cell(cell_dict["cell_type"])
+
+    def check_cell(self, cell_dict, separator, text):
+        # --validate. Keep the errors of the cell with its line number.
+        self.line += separator.count("\n")
+        for message in validate_cell(cell_dict):
+            self.errors.append("cell {} (line {}): {}".format(
+                    self.cell_total + 1, self.line, message))
+        self.line += text.count("\n")
+
+    def get_closed_size(self, text=None):
+        # The size the file would be if closed now, or after adding the
+        # encoded text of one more cell
+        size = self.byte_total + get_text_size(self.trailer)
+        if text is not None:
+            size += len(self.get_separator()) + get_text_size(text)
+        if self.cell_total == 0 and text is None:
+            return size + len("]")
+        return size + len(self.closing)
+
+    def close(self):
+        # Finish the notebook and move it into place
+        if self.errors:
+            self.abort()
+            raise ValueError("{} would not be a valid notebook: {}".format(
+                    self.ipynb_filename, "; ".join(
+                    self.errors[:VALIDATE_MAX_ERRORS])))
+        if self.stats is not None:
+            self.stats.bytes_out += self.get_closed_size()
+        with self.phase("write"):
+            if self.cell_total == 0:
+                self.f.write("]")
+            else:
+                self.f.write(self.closing)
+            self.f.write(self.trailer)
+            if self.to_stdout:
+                self.f.detach()
+            elif self.archive is None:
+                finish_temp_file(self.f, self.temp_filename,
+                        self.ipynb_filename)
+            else:
+                self.archive.add_entry(self.f, self.ipynb_filename)
+
+    def abort(self):
+        # Discard the temporary file. The existing ipynb file is untouched.
+        # What was written to stdout can not be taken back, but stdout is
+        # left open.
+        if self.to_stdout:
+            self.f.detach()
+        elif self.archive is None:
+            discard_temp_file(self.f, self.temp_filename)
+        else:
+            self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+def write_ipynb(ipynb_filename, cells, options=None, stats=None, archive=None,
+        metadata=None):
+    # Stream an iterable of cell dictionaries to the ipynb file. metadata is
+    # added to the notebook metadata. Returns the number of cells written.
+    with NotebookWriter(ipynb_filename, options, stats, archive,
+            metadata) as writer:
+        for cell_dict in cells:
+            writer.add_cell(cell_dict)
+    return writer.cell_total
+
+
+def get_part_filename(ipynb_filename, number):
+    # The ipynb file of one part of a sharded notebook. E.g. name-001.ipynb
+    root, extension = os.path.splitext(ipynb_filename)
+    return "{}-{:03}{}".format(root, number, extension)
+
+
+def get_written_parts(ipynb_filename):
+    # The number of parts an earlier conversion wrote, as recorded in the
+    # metadata of its index notebook. 0 if ipynb_filename is not an index.
+    try:
+        if os.path.getsize(ipynb_filename) > PARTS_INDEX_MAX_SIZE:
+            return 0
+        with open(ipynb_filename, "r", encoding="utf-8") as f:
+            parts = json.load(f)["metadata"][PARTS_METADATA_KEY]["parts"]
+    except (OSError, ValueError, KeyError, TypeError):
+        return 0
+    if not is_count(parts):
+        return 0
+    return parts
+
+
+def remove_stale_parts(ipynb_filename, number, part_total):
+    # Remove the parts, from number to part_total, left by an earlier
+    # conversion that made more parts than this one. part_total is from
+    # get_written_parts(), so only files this program wrote are removed.
+    for stale_number in range(number, part_total + 1):
+        try:
+            os.remove(get_part_filename(ipynb_filename, stale_number))
+        except FileNotFoundError:
+            pass
+
+
+def get_cell_heading(cell_dict):
+    # The text of the markdown heading that starts the cell, or None
+    if cell_dict["cell_type"] != "markdown":
+        return None
+    for line in cell_dict["source"]:
+        if line.strip():
+            if line.startswith("#"):
+                return line.strip("# \t\n")
+            return None
+    return None
+
+
+def is_part_full(writer, text, options):
+    # True if the cell, with its encoded text, should start a new part
+    if options["max_cells"] and writer.cell_total >= options["max_cells"]:
+        return True
+    if options["max_bytes"]:
+        return writer.get_closed_size(text) > options["max_bytes"]
+    return False
+
+
+def new_index_cell(ipynb_filename, part_list):
+    # The markdown cell of the index notebook, which links to each part.
+    # part_list holds (part_filename, cell_total, heading) for each part.
+    # The link is percent-encoded and the markdown in its text escaped, so a
+    # name with spaces, brackets or <> still links to its part.
+    # Imported here, as only an index needs it
+    import urllib.parse
+    name = os.path.splitext(os.path.basename(ipynb_filename))[0]
+    lines = ["# {}\n".format(MARKDOWN_SPECIAL.sub(r"\\\1", name)), "\n",
+            "The notebook is in {} parts:\n".format(len(part_list)), "\n"]
+    for number, (part_filename, cell_total, heading) in enumerate(part_list, 1):
+        part_name = os.path.basename(part_filename)
+        if heading:
+            description = "{} ({} cells)".format(heading, cell_total)
+        else:
+            description = "{} cells".format(cell_total)
+        lines.append("{}. [{}]({}) - {}\n".format(number,
+                MARKDOWN_SPECIAL.sub(r"\\\1", part_name),
+                urllib.parse.quote(part_name), description))
+    lines[-1] = lines[-1].rstrip("\n")
+    return new_markdown_cell(lines)
+
+
+def write_ipynb_parts(ipynb_filename, cells, options, report=print,
+        stats=None, archive=None):
+    # Stream the cells into parts of at most --max-cells cells and
+    # --max-bytes bytes, name-001.ipynb, name-002.ipynb and so on, with an
+    # index notebook name.ipynb that links to them. Only the cell being
+    # written is held in memory. With --split-at-headings a full part goes on
+    # until the next markdown cell that starts with a heading. A single cell
+    # larger than --max-bytes is a part of its own. If everything fits in one
+    # part it is written as name.ipynb. Returns the number of cells written.
+    part_list = []
+    heading = None
+    written_parts = 0
+    if archive is None:
+        written_parts = get_written_parts(ipynb_filename)
+    writer = NotebookWriter(get_part_filename(ipynb_filename, 1), options,
+            stats, archive)
+    try:
+        for cell_dict in cells:
+            text = writer.encode_cell(cell_dict)
+            cell_heading = get_cell_heading(cell_dict)
+            if (writer.cell_total > 0 and is_part_full(writer, text, options)
+                    and (cell_heading is not None
+                    or not options["split_at_headings"])):
+                writer.close()
+                report("ipynb file created: {}".format(writer.ipynb_filename))
+                part_list.append((writer.ipynb_filename, writer.cell_total,
+                        heading))
+                heading = None
+                writer = NotebookWriter(get_part_filename(ipynb_filename,
+                        len(part_list) + 1), options, stats, archive)
+            if heading is None:
+                heading = cell_heading
+            writer.add_cell(cell_dict, text)
+    except BaseException:
+        writer.abort()
+        raise
+
+    if not part_list:
+        # Everything fitted in one notebook
+        writer.ipynb_filename = ipynb_filename
+        writer.close()
+        remove_stale_parts(ipynb_filename, 1, written_parts)
+        report("ipynb file created: {}".format(ipynb_filename))
+        return writer.cell_total
+
+    writer.close()
+    report("ipynb file created: {}".format(writer.ipynb_filename))
+    part_list.append((writer.ipynb_filename, writer.cell_total, heading))
+    remove_stale_parts(ipynb_filename, len(part_list) + 1, written_parts)
+    write_ipynb(ipynb_filename, [new_index_cell(ipynb_filename, part_list)],
+            options, stats, archive,
+            {PARTS_METADATA_KEY: {"parts": len(part_list)}})
+    report("ipynb file created: {}, the index of {} parts"
+            .format(ipynb_filename, len(part_list)))
+    return sum(cell_total for _, cell_total, _ in part_list)
+
+
+def get_cell_key(cell_dict):
+    # The cell type, the format of a raw cell and a hash of the source.
+    # Cells with the same key are the same cell, for --update.
+    source = cell_dict.get("source", "")
+    if isinstance(source, list):
+        source = "".join(source)
+    digest = hashlib.sha256(str(source).encode("utf-8")).hexdigest()
+    raw_format = None
+    metadata = cell_dict.get("metadata")
+    if cell_dict.get("cell_type") == "raw" and isinstance(metadata, dict):
+        raw_format = metadata.get("format")
+    return cell_dict.get("cell_type"), str(raw_format), digest
+
+
+def load_old_cells(ipynb_filename, report=print):
+    # The cells of the existing ipynb file, for --update. An empty list if
+    # there is no file or it is not a notebook that can be read.
+    try:
+        with open(ipynb_filename, "r", encoding="utf-8") as f:
+            cells = json.load(f)["cells"]
+    except FileNotFoundError:
+        return []
+    except (ValueError, KeyError, TypeError) as e:
+        report("Can not read the cells of {}, its outputs are not kept: {}"
+                .format(ipynb_filename, e))
+        return []
+    if not isinstance(cells, list):
+        return []
+    return [cell_dict for cell_dict in cells if isinstance(cell_dict, dict)]
+
+
+def update_cells(ipynb_filename, cells, report=print):
+    # --update. Match the new cells against the cells of the existing ipynb
+    # file with a sequence diff of their keys. A cell whose type and source
+    # are unchanged keeps its metadata and attachments and, for a code cell,
+    # its outputs and execution count, so the notebook need not be run
+    # again after an edit elsewhere. The metadata this program makes, such
+    # as the format of a raw cell, replaces the old values. Returns the list
+    # of new cells, as all of them are needed for the diff.
+    new_cell_list = list(cells)
+    old_cell_list = load_old_cells(ipynb_filename, report)
+    if not old_cell_list:
+        return new_cell_list
+    matcher = difflib.SequenceMatcher(None,
+            [get_cell_key(cell_dict) for cell_dict in old_cell_list],
+            [get_cell_key(cell_dict) for cell_dict in new_cell_list],
+            autojunk=False)
+    kept_total = 0
+    for old_index, new_index, size in matcher.get_matching_blocks():
+        for old_cell, new_cell in zip(
+                old_cell_list[old_index:old_index + size],
+                new_cell_list[new_index:new_index + size]):
+            keys = UPDATE_CELL_KEYS
+            if new_cell["cell_type"] == "code":
+                keys += UPDATE_CODE_CELL_KEYS
+            for key in keys:
+                if key not in old_cell:
+                    continue
+                if (key == "metadata" and isinstance(old_cell[key], dict)
+                        and isinstance(new_cell.get(key), dict)):
+                    new_cell[key] = dict(old_cell[key], **new_cell[key])
+                else:
+                    new_cell[key] = old_cell[key]
+            kept_total += 1
+    report("Unchanged cells kept from {}: {} of {}".format(ipynb_filename,
+            kept_total, len(new_cell_list)))
+    return new_cell_list
+
+
+class Kernel:
+    # --execute. A python process that runs code cells, started from
+    # KERNEL_PROGRAM. Requests and replies are json lines over its stdin and
+    # stdout. The replies are read by a thread into a queue, so a reply can
+    # be waited for with a timeout. Its stderr is that of this process.
+
+    def __init__(self):
+        # Imported here, as only --execute needs them
+        import queue
+        import subprocess
+        import threading
+        self.process = subprocess.Popen([sys.executable, "-c",
+                KERNEL_PROGRAM], stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE)
+        self.replies = queue.Queue()
+        self.reader = threading.Thread(target=self.read_replies, daemon=True)
+        self.reader.start()
+
+    def read_replies(self):
+        # Runs in the reader thread. None marks the end of the process.
+        for line in self.process.stdout:
+            self.replies.put(line)
+        self.replies.put(None)
+
+    def request(self, message, timeout=None):
+        # Send a request and return the reply. Raises TimeoutError if there
+        # is no reply within timeout seconds and EOFError if the kernel
+        # stopped, e.g. a cell called os._exit().
+        import queue
+        try:
+            self.process.stdin.write(json.dumps(message).encode("utf-8")
+                    + b"\n")
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError):
+            raise EOFError("The kernel stopped.")
+        try:
+            line = self.replies.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError("Cell did not finish within {} seconds."
+                    .format(timeout))
+        if line is None:
+            raise EOFError("The kernel stopped.")
+        return json.loads(line)
+
+    def reset(self, directory):
+        # Start a new notebook: an empty namespace and the notebook's
+        # directory as the current directory. Imported modules stay loaded.
+        self.request({"op": "reset", "cwd": os.path.abspath(directory)},
+                KERNEL_START_TIMEOUT)
+
+    def run(self, code, timeout=None):
+        # Run the code of a cell. Returns the reply, which holds the text
+        # written to stdout and stderr, the repr of the value of a final
+        # expression and the error raised.
+        return self.request({"op": "run", "code": code}, timeout)
+
+    def close(self):
+        # Closing stdin ends the kernel
+        try:
+            self.process.stdin.close()
+            self.process.wait(KERNEL_START_TIMEOUT)
+        except Exception:
+            self.kill()
+
+    def kill(self):
+        self.process.kill()
+        self.process.wait()
+
+
+class KernelPool:
+    # --execute. Kernels kept warm for the notebooks of a run, so the start
+    # up of python and the imports of a notebook are paid once per kernel
+    # rather than once per notebook. Up to size kernels run at once, one per
+    # notebook being executed. A kernel that timed out or stopped is
+    # discarded and a new one started in its place. Thread safe, for
+    # --in-flight.
+
+    def __init__(self, size):
+        # Imported here, as only --execute needs it
+        import threading
+        self.size = size
+        self.idle = []
+        self.running = 0
+        self.condition = threading.Condition()
+
+    def start(self):
+        # Start all the kernels now, so they warm up while files are read
+        with self.condition:
+            while self.running < self.size:
+                self.idle.append(Kernel())
+                self.running += 1
+
+    def acquire(self):
+        # A kernel for one notebook. Waits if all size kernels are busy.
+        with self.condition:
+            while not self.idle and self.running >= self.size:
+                self.condition.wait()
+            if self.idle:
+                return self.idle.pop()
+            self.running += 1
+        return Kernel()
+
+    def release(self, kernel):
+        with self.condition:
+            self.idle.append(kernel)
+            self.condition.notify()
+
+    def discard(self, kernel):
+        # Kill a kernel that can not be used again and start another
+        kernel.kill()
+        self.release(Kernel())
+
+    def close(self):
+        with self.condition:
+            idle, self.idle = self.idle, []
+        for kernel in idle:
+            kernel.close()
+
+
+def get_kernel_pool(options):
+    # The KernelPool of this process, created on first use. Each worker
+    # process of --jobs has a pool of its own. Otherwise the pool has one
+    # kernel for each file converted at once, unless --kernels is set.
+    if "pool" not in KERNEL_POOL_CACHE:
+        # Imported here, as only --execute needs it
+        import atexit
+        size = options["kernels"] or options["in_flight"]
+        pool = KernelPool(size)
+        atexit.register(pool.close)
+        KERNEL_POOL_CACHE["pool"] = pool
+    return KERNEL_POOL_CACHE["pool"]
+
+
+def get_cell_outputs(reply, execution_count):
+    # The nbformat outputs of the reply to a run request, in the order
+    # they were written. Keys are sorted as nbformat writes them.
+    outputs = []
+    for name, text in reply["streams"]:
+        outputs.append({"name": name, "output_type": "stream",
+                "text": split_source(text)})
+    if reply["result"] is not None:
+        outputs.append({"data": {"text/plain": split_source(
+                reply["result"])}, "execution_count": execution_count,
+                "metadata": {}, "output_type": "execute_result"})
+    if reply["error"] is not None:
+        outputs.append(new_error_output(reply["error"]["ename"],
+                reply["error"]["evalue"], reply["error"]["traceback"]))
+    return outputs
+
+
+def new_error_output(ename, evalue, traceback_text):
+    # An error output. The traceback is a list of lines without newlines.
+    return {"ename": ename, "evalue": evalue, "output_type": "error",
+            "traceback": traceback_text.splitlines()}
+
+
+def execute_cells(cells, ipynb_filename, options, report=print,
+        directory=None):
+    # Generator. --execute. Run the code cells on a kernel from the pool as
+    # they stream through, and yield each cell with its outputs and
+    # execution count. The notebook runs in directory, that of the ipynb
+    # file by default. A cell that raises, or runs longer than
+    # --cell-timeout seconds, gets an error output and the cells after it
+    # are not run. A kernel that timed out is replaced.
+    if directory is None:
+        directory = os.path.dirname(ipynb_filename) or os.curdir
+    timeout = options["cell_timeout"] or None
+    pool = get_kernel_pool(options)
+    kernel = pool.acquire()
+    try:
+        kernel.reset(directory)
+        execution_count = 0
+        for cell_dict in cells:
+            if cell_dict["cell_type"] == "code" and kernel is not None:
+                execution_count += 1
+                cell_dict["execution_count"] = execution_count
+                try:
+                    reply = kernel.run("".join(cell_dict["source"]), timeout)
+                except (TimeoutError, EOFError) as e:
+                    pool.discard(kernel)
+                    kernel = None
+                    cell_dict["outputs"] = [new_error_output(
+                            type(e).__name__, str(e), "")]
+                    report("Execution of {} stopped at cell {}: {} The "
+                            "kernel was restarted.".format(ipynb_filename,
+                            execution_count, e))
+                else:
+                    cell_dict["outputs"] = get_cell_outputs(reply,
+                            execution_count)
+                    if reply["error"] is not None:
+                        report("Execution of {} stopped at cell {}: {}: {}"
+                                .format(ipynb_filename, execution_count,
+                                reply["error"]["ename"],
+                                reply["error"]["evalue"]))
+                        pool.release(kernel)
+                        kernel = None
+            yield cell_dict
+        if kernel is not None:
+            report("Executed {} code cells of {}".format(execution_count,
+                    ipynb_filename))
+    finally:
+        if kernel is not None:
+            pool.release(kernel)
+
+
+def write_notebook(ipynb_filename, cells, options, report=print, stats=None,
+        archive=None):
+    # Write the cells to the ipynb file, or to several parts if --max-cells
+    # or --max-bytes is set. Returns the number of cells written. With stats
+    # the time taken to make the cell dictionaries is the build phase. With
+    # an archive the notebooks are added to it rather than written as files.
+    if stats is not None:
+        cells = stats.timed(cells, "build")
+    if options["update"] and archive is None:
+        cells = update_cells(ipynb_filename, cells, report)
+    if options["execute"]:
+        cells = execute_cells(cells, ipynb_filename, options, report,
+                os.curdir if archive is not None else None)
+        if stats is not None:
+            cells = stats.timed(cells, "execute")
+    if options["max_cells"] or options["max_bytes"]:
+        return write_ipynb_parts(ipynb_filename, cells, options, report,
+                stats, archive)
+    cell_total = write_ipynb(ipynb_filename, cells, options, stats, archive)
+    report("ipynb file created: {}".format(ipynb_filename))
+    return cell_total
+
+
+def new_markdown_cell(source_lines):
+    # Return a markdown cell
+    """
+      {
+       "cell_type": "markdown",
+       "metadata": {},
+       "source": [
+        "# hello_world_1\n",
+        "\n",
+        "Created from a text file."
+       ]
+      }
+    """
+    cell_dict = {}
+    cell_dict.update({
+            "cell_type": "markdown", 
+            "metadata": {}, 
+            "source": source_lines})
+    return cell_dict
+
+
+def new_code_cell(source_lines):
+    # Return a code cell
+    """
+      {
+       "cell_type": "code",
+       "execution_count": null,
+       "metadata": {},
+       "outputs": [],
+       "source": [
+        "print(\"hello world\")\n",
+        "print(1+2)"
+       ]
+      }
+    """
+    cell_dict = {}
+    cell_dict.update({
+            "cell_type": "code",
+            "execution_count": None, 
+            "metadata": {}, 
+            "outputs": [],
+            "source": source_lines})
+    return cell_dict
+
+
+def new_cell(cell_type, source_lines):
+    # Return a cell of cell_type. A raw cell type may hold the format, as
+    # "raw text/html" from the delimiter <raw text/html>. None if unknown.
+    if cell_type == "markdown":
+        return new_markdown_cell(source_lines)
+    if cell_type == "code":
+        return new_code_cell(source_lines)
+    if cell_type == "raw":
+        return new_raw_cell(source_lines)
+    if cell_type.startswith("raw "):
+        return new_raw_cell(source_lines, cell_type[4:])
+    return None
+
+
+def json_add_markdown(data, source_lines):
+    # Add a markdown cell to the json data
+    data["cells"].append(new_markdown_cell(source_lines))
+    return data
+
+
+def json_add_code(data, source_lines):
+    # Add a code cell to the json data
+    data["cells"].append(new_code_cell(source_lines))
+    return data
+
+
+def new_raw_cell(source_lines, raw_format=None):
+    # Return a raw cell. raw_format is the mime type of the nbconvert format
+    # the cell is for. nbconvert to other formats leaves the cell out.
+    """
+      {
+       "cell_type": "raw",
+       "metadata": {
+        "format": "text/restructuredtext"
+       },
+       "source": [
+        ".. note:: Kept as it is by nbconvert."
+       ]
+      }
+    """
+    metadata = {}
+    if raw_format:
+        metadata["format"] = raw_format
+    cell_dict = {}
+    cell_dict.update({
+            "cell_type": "raw",
+            "metadata": metadata,
+            "source": source_lines})
+    return cell_dict
+
+
+def add_cell_raw(data, source_lines, raw_format=None):
+    # Add a raw cell to the json data
+    data["cells"].append(new_raw_cell(source_lines, raw_format))
+    return data
+
+
+def add_cell(data, cell_type, source_lines):
+    # Add a cell of cell_type to the in memory notebook data
+    cell_dict = new_cell(cell_type, source_lines)
+    if cell_dict is not None:
+        data["cells"].append(cell_dict)
+    return data
+
+
+def process_text_file(text_file, parser="lines", stats=None):
+    # Generator. Read the text file and yield each cell as soon as the next
+    # delimiter closes it. Yields (cell_type, source_lines):
+    # cell_type - "markdown", "code" or "raw", which may be followed by the
+    # format, e.g. "raw text/html"
+    # source_lines - list of the lines of the cell, each keeping its newline
+    # parser "lines" reads the file line by line. "mmap" maps the file into
+    # memory and finds the delimiters with a regular expression, see
+    # parse_text_buffer(). With stats the reading of the lines and the
+    # parsing are timed. The mmap parser reads as it parses. Included files
+    # are read by an IncludeReader.
+    with open(text_file, "r") as fin:
+        yield from parse_text_stream(fin, IncludeReader(text_file), parser,
+                stats)
+
+
+def parse_text_stream(fin, include=None, parser="lines", stats=None):
+    # Generator. The cells of process_text_file() from text open as fin.
+    # The mmap parser is only used if fin is a file it can map.
+    if parser == "mmap" and can_map_text_file(fin):
+        cells = parse_text_mapped(fin, include)
+    elif stats is not None:
+        cells = parse_text_lines(stats.timed(fin, "read"), include)
+    else:
+        cells = parse_text_lines(fin, include)
+    if stats is not None:
+        cells = stats.timed(cells, "parse")
+    yield from cells
+
+
+def get_delimiter_keyword(line):
+    # The first word of a delimiter line. E.g. "code" from "< code A comment>"
+    # Raises IndexError for an empty delimiter such as "<>".
+    line = line.strip()  # Get rid of newline and rhs spaces
+    line = line[1:-1]  # Get rid of <, > which should be at the ends
+    line = line.strip() # get rid of stray spaces
+    line_list = line.split() # Might be comment with keyword
+    return line_list[0]
+
+
+def get_include_path(delimiter):
+    # The path of an include delimiter. E.g. "setup.txt" from
+    # "< include setup.txt >". A path may hold spaces.
+    text = delimiter.strip()[1:-1].strip()
+    word_list = text.split(None, 1)
+    if len(word_list) < 2:
+        raise ValueError("{} needs the path of a file to include."
+                .format(delimiter.strip()))
+    return word_list[1].strip()
+
+
+class IncludeReader:
+    # <include path>. Reads the files included by a text file, for the
+    # parsers. Called with the delimiter line, it returns ("cells", cells)
+    # for a .txt file, parsed with its own includes, or ("lines", lines) for
+    # any other file. The path is relative to the directory of the file that
+    # includes it. Each included file is read once per process and kept in
+    # INCLUDE_CACHE, with its [mtime_ns, size] and those of the files it
+    # includes, until one of them changes. A worker process of --jobs has a
+    # cache of its own. stack is the chain of files being included, to stop
+    # a loop. files is the set of all the files included, directly or not.
+
+    def __init__(self, text_file=None, stack=()):
+        if text_file is None:
+            # stdin. Paths are relative to the current directory.
+            self.directory = os.curdir
+            self.stack = stack
+        else:
+            self.directory = os.path.dirname(text_file)
+            self.stack = stack + (os.path.realpath(text_file),)
+        self.files = set()
+
+    def __call__(self, delimiter):
+        path = os.path.realpath(os.path.join(self.directory,
+                get_include_path(delimiter)))
+        if path in self.stack:
+            raise ValueError("Include loop: {}".format(" -> ".join(
+                    self.stack + (path,))))
+        file_stat = get_file_stat(path)
+        if file_stat is None:
+            raise FileNotFoundError("Included file not found: {}"
+                    .format(path))
+        cached = INCLUDE_CACHE.get(path)
+        if (cached is not None and cached[0] == file_stat
+                and all(get_file_stat(nested_path) == nested_stat
+                for nested_path, nested_stat in cached[3].items())):
+            kind, content, nested = cached[1:]
+        else:
+            kind, content, nested = self.read(path)
+            INCLUDE_CACHE[path] = (file_stat, kind, content, nested)
+        self.files.add(path)
+        self.files.update(nested)
+        return kind, content
+
+    def read(self, path):
+        # Read an included file. Returns (kind, content, nested), where
+        # nested holds the [mtime_ns, size] of the files it includes.
+        with open(path, "r") as fin:
+            if not has_extension(path, ("txt",)):
+                return "lines", fin.readlines(), {}
+            reader = IncludeReader(path, self.stack)
+            cells = list(parse_text_lines(fin, reader))
+        nested = dict((nested_path, get_file_stat(nested_path))
+                for nested_path in reader.files)
+        return "cells", cells, nested
+
+
+def has_content(source_lines):
+    # True if any of the lines is not blank
+    return any(line.strip() for line in source_lines)
+
+
+def include_delimiter(include, delimiter, cell_type, source_lines, resumed):
+    # Apply an include delimiter within the cell being read. The lines of a
+    # file that is not .txt are added to the cell. The cells of a .txt file
+    # are placed after the cell, which then resumes, empty, after them. A
+    # resumed cell is dropped if it stays blank. Before the first delimiter
+    # an included file adds only its cells. Returns (cells, source_lines,
+    # resumed), the cells to yield and the state of the cell being read.
+    kind, content = include(delimiter)
+    if kind == "lines":
+        if cell_type is None:
+            return [], source_lines, resumed
+        return [], source_lines + content, False
+    cells = []
+    if cell_type is not None and not (resumed and not has_content(
+            source_lines)):
+        cells.append((cell_type, source_lines))
+    for include_type, include_lines in content:
+        cells.append((include_type, list(include_lines)))
+    return cells, [], cell_type is not None
+
+
+def get_raw_cell_type(delimiter):
+    # The cell type of a raw delimiter. "raw text/html" for <raw text/html>,
+    # which gives the cell a format. Otherwise "raw", as other words are a
+    # comment.
+    word_list = delimiter.strip()[1:-1].split()
+    if len(word_list) == 2 and RAW_FORMAT.match(word_list[1]):
+        return "raw " + word_list[1]
+    return "raw"
+
+
+def parse_text_lines(lines, include=None):
+    # Generator. Split an iterable of text lines into cells at the delimiters.
+    # Only the lines of the current cell are held in memory.
+    # <comment> can be in a file. Ignore.
+    # Lines of text before the first delimiter are ignored.
+    # <include path> is applied by include, an IncludeReader. Without one
+    # it is ignored as other delimiters are.
+    cell_type = None
+    source_lines = []
+    resumed = False
+    for line in lines:
+
+        if len(line) > 0 and line.startswith("<"):
+            keyword = get_delimiter_keyword(line)
+            if keyword == "comment":
+                continue
+
+            if keyword in ("markdown", "code", "raw"):
+                #print("|" + line + "|")
+                if cell_type is not None and not (resumed
+                        and not has_content(source_lines)):
+                    yield cell_type, source_lines
+                cell_type = keyword
+                if keyword == "raw":
+                    cell_type = get_raw_cell_type(line)
+                source_lines = []
+                resumed = False
+                continue
+
+            if keyword == "include" and include is not None:
+                cells, source_lines, resumed = include_delimiter(include,
+                        line, cell_type, source_lines, resumed)
+                yield from cells
+                continue
+
+        else:
+            if cell_type is None:
+                continue
+            else:
+                source_lines.append(line)
+
+    # Enter last data
+    if cell_type is not None and not (resumed
+            and not has_content(source_lines)):
+        yield cell_type, source_lines
+
+
+def can_map_text_file(fin):
+    # The mmap parser works on the bytes of the file. It is used when the
+    # encoding keeps "<" and "\n" as single bytes that are never part of
+    # another character, and there are no "\r" line ends that reading in
+    # text mode would translate. mmap can not map an empty file, nor a file
+    # read from an archive, which has no file descriptor.
+    if codecs.lookup(fin.encoding).name not in MMAP_ENCODINGS:
+        return False
+    try:
+        fin.fileno()
+    except OSError:
+        return False
+    if os.fstat(fin.fileno()).st_size == 0:
+        return False
+    with mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        return buffer.find(b"\r") == -1
+
+
+def parse_text_mapped(fin, include=None):
+    # Generator. Map the open text file into memory and parse it.
+    with mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        yield from parse_text_buffer(buffer, fin.encoding, include)
+
+
+def split_lines(text):
+    # Split text into lines at "\n" only, as a file read in text mode is.
+    # str.splitlines() would also split at "\f", "\x85" and others.
+    source_lines = text.split("\n")
+    last_line = source_lines.pop()
+    source_lines = [line + "\n" for line in source_lines]
+    if last_line:
+        source_lines.append(last_line)
+    return source_lines
+
+
+def has_other_line_breaks(buffer, encoding):
+    # True if the buffer holds a line break, other than "\n", at which
+    # str.splitlines() would split. Each is searched for in the bytes.
+    for character in OTHER_LINE_BREAKS:
+        try:
+            if buffer.find(character.encode(encoding)) != -1:
+                return True
+        except UnicodeEncodeError:
+            continue
+    return False
+
+
+def parse_text_buffer(buffer, encoding, include=None):
+    # Generator. The same cells as parse_text_lines() from the bytes of a
+    # text file, e.g. an mmap. The delimiter lines are found with one pass of
+    # a regular expression over the buffer, so content lines are not looked
+    # at one by one. TXT_DELIMITER begins with the literal "\n<", which lets
+    # the regular expression engine skip ahead rather than test each line
+    # start as "^<" would. A cell is kept as the offsets of the runs of
+    # content between its delimiter lines, and is only decoded when yielded.
+    # At an include delimiter the cell so far is decoded into source_lines.
+    other_breaks = has_other_line_breaks(buffer, encoding)
+    cell_type = None
+    segments = []
+    source_lines = []
+    resumed = False
+    position = 0
+    # The keyword of each delimiter line seen, as most are repeated
+    keyword_cache = {}
+    with memoryview(buffer) as view:
+        match = TXT_FIRST_DELIMITER.match(buffer)
+        span_list = [match.span()] if match is not None else []
+        for start, end in itertools.chain(span_list, (match.span(1)
+                for match in TXT_DELIMITER.finditer(buffer))):
+            if cell_type is not None and start > position:
+                segments.append((position, start))
+            # The delimiter line ends after its newline
+            position = end + 1
+            delimiter = buffer[start:end]
+            keyword = keyword_cache.get(delimiter)
+            if keyword is None:
+                match = TXT_KEYWORD.match(delimiter)
+                if match is not None:
+                    # E.g. "<comment A note>", which is seldom repeated
+                    keyword = match.group(1).decode("ascii")
+                else:
+                    keyword = get_delimiter_keyword(str(delimiter, encoding))
+                    keyword_cache[delimiter] = keyword
+            if keyword in ("markdown", "code", "raw"):
+                if cell_type is not None:
+                    lines = decode_segments(view, segments, encoding,
+                            other_breaks)
+                    if source_lines:
+                        lines = source_lines + lines
+                    if not (resumed and not has_content(lines)):
+                        yield cell_type, lines
+                cell_type = keyword
+                if keyword == "raw":
+                    cell_type = get_raw_cell_type(str(delimiter, encoding))
+                segments = []
+                source_lines = []
+                resumed = False
+            elif keyword == "include" and include is not None:
+                source_lines = source_lines + decode_segments(view, segments,
+                        encoding, other_breaks)
+                segments = []
+                cells, source_lines, resumed = include_delimiter(include,
+                        str(delimiter, encoding), cell_type, source_lines,
+                        resumed)
+                yield from cells
+
+        # Enter last data
+        if cell_type is not None:
+            if position < len(buffer):
+                segments.append((position, len(buffer)))
+            lines = decode_segments(view, segments, encoding, other_breaks)
+            if source_lines:
+                lines = source_lines + lines
+            if not (resumed and not has_content(lines)):
+                yield cell_type, lines
+
+
+def decode_segments(view, segments, encoding, other_breaks):
+    # Decode the runs of content of a cell, straight from the buffer, and
+    # return them as a list of lines. Each run ends at the end of a line.
+    # The faster str.splitlines() is used unless the file has other_breaks.
+    if len(segments) == 1:
+        start, end = segments[0]
+        text = str(view[start:end], encoding)
+    else:
+        text = "".join(str(view[start:end], encoding)
+                for start, end in segments)
+    if other_breaks:
+        return split_lines(text)
+    return text.splitlines(True)
+
+
+def process_py_file(py_file):
+    # Read the python file and return it as a list of source lines
+    with open(py_file, "r") as fin:
+        py_lines = fin.readlines()
+    return py_lines
+
+
+def split_source(text):
+    # Split text into nbformat style source lines, each keeping its newline
+    return text.splitlines(True)
+
+
+def strip_comment(line):
+    # Remove the "# " from the start of a comment line for a markdown cell
+    if line.startswith("# "):
+        return line[2:]
+    return line[1:]
+
+
+def get_docstring_lines(string):
+    # Return the text of a docstring token as markdown source lines, or None
+    # if it isn't a plain string. E.g. a bytes or f-string.
+    try:
+        text = ast.literal_eval(string)
+    except (ValueError, SyntaxError):
+        return None
+    if not isinstance(text, str):
+        return None
+    import inspect  # Only needed by --split-py. Keeps the library import fast.
+    return split_source(inspect.cleandoc(text))
+
+
+def get_py_cell(cell_type, lines):
+    # Tidy the lines of a cell made by parse_py_lines(). Blank lines at the
+    # start and end are removed, as is the newline of the last line. Returns
+    # (cell_type, source_lines), or None if the cell is empty.
+    start = 0
+    end = len(lines)
+    while start < end and lines[start].strip() == "":
+        start += 1
+    while end > start and lines[end - 1].strip() == "":
+        end -= 1
+    if start == end:
+        return None
+    source_lines = lines[start:end]
+    source_lines[-1] = source_lines[-1].rstrip("\n")
+    return cell_type, source_lines
+
+
+def parse_py_lines(fin, split_mode):
+    # Generator. Split a python program into cells in a single tokenize pass
+    # and yield (cell_type, source_lines) for each cell as it completes.
+    # o "# %%" and "# In[ ]:" comment lines start a new cell. "# %% [markdown]"
+    #   starts a markdown cell made from the comment lines that follow.
+    # o The module docstring becomes a markdown cell.
+    # o A block of comment lines at the top level, with a blank line before
+    #   and after, becomes a markdown cell.
+    # o With split_mode "defs" each top level def or class, with its
+    #   decorators and the comments directly above, is a cell of its own.
+    # A top level statement starts at column 0 outside of any brackets. The
+    # lines between statements that are blank or comments at column 0 are the
+    # gap before the next statement. Only the lines of the current statement
+    # and its gap are held, apart from the lines of the cell being built.
+    buffer = []         # Lines read by tokenize that are not yet in a cell
+    buffer_row = 1      # Row number of buffer[0]
+    kinds = {}          # Row number to "blank" or "comment" at bracket depth 0
+    cell = {"type": "code", "lines": [], "marker": False, "free": False}
+    state = {"last_kind": None}
+
+    def readline():
+        line = fin.readline()
+        if line:
+            buffer.append(line)
+        return line
+
+    def take_rows(end_row):
+        # Remove the buffered lines before end_row. Returns (line, kind) pairs.
+        nonlocal buffer_row
+        count = end_row - buffer_row
+        rows = [(line, kinds.pop(buffer_row + index, None))
+                for index, line in enumerate(buffer[:count])]
+        del buffer[:count]
+        buffer_row = end_row
+        return rows
+
+    def flush():
+        # Finish the current cell. Returns a list of zero or one cells.
+        py_cell = get_py_cell(cell["type"], cell["lines"])
+        cell.update({"type": "code", "lines": [], "marker": False,
+                "free": False})
+        state["last_kind"] = None
+        if py_cell is None:
+            return []
+        return [py_cell]
+
+    def place_gap(rows, next_kind, is_header):
+        # Place the blank and comment lines between two statements
+        out = []
+        leading_start = len(rows)
+        if next_kind is not None:
+            while (leading_start > 0 and rows[leading_start - 1][1] == "comment"
+                    and not PY_MARKER.match(rows[leading_start - 1][0])):
+                leading_start -= 1
+        for index, (line, kind) in enumerate(rows[:leading_start]):
+            marker = PY_MARKER.match(line) if kind == "comment" else None
+            if marker:
+                out += flush()
+                if "[markdown]" in marker.group(2):
+                    cell["type"] = "markdown"
+                cell["marker"] = True
+            elif kind == "blank":
+                if cell["free"]:
+                    out += flush()
+                else:
+                    cell["lines"].append(line)
+            elif cell["type"] == "markdown":
+                cell["lines"].append(strip_comment(line))
+            elif cell["marker"] or (is_header and index < 2
+                    and (line.startswith("#!") or PY_CODING.match(line))):
+                cell["lines"].append(line)
+            else:
+                # A free standing block of comments
+                if not cell["free"]:
+                    out += flush()
+                    cell.update({"type": "markdown", "free": True})
+                cell["lines"].append(strip_comment(line))
+
+        # The comments directly above the next statement go with it
+        if next_kind is not None:
+            if cell["type"] == "markdown":
+                out += flush()
+            elif next_kind == "docstring":
+                # E.g. a #! line directly above the docstring
+                cell["lines"].extend(line for line, kind in rows[leading_start:])
+                return out + flush()
+            elif split_mode == "defs":
+                last_kind = state["last_kind"]
+                if next_kind in ("def", "decorator"):
+                    if last_kind != "decorator":
+                        out += flush()
+                elif last_kind in ("def", "decorator"):
+                    out += flush()
+            cell["lines"].extend(line for line, kind in rows[leading_start:])
+            state["last_kind"] = next_kind
+        return out
+
+    def start_statement(row, next_kind):
+        # A new top level statement starts at row, or the end of the file if
+        # next_kind is None. Place the previous statement and the gap.
+        out = []
+        if statement["row"] is None:
+            rows = take_rows(row)
+            return place_gap(rows, next_kind, True)
+        rows = take_rows(row)
+        gap_start = len(rows)
+        while gap_start > 1 and rows[gap_start - 1][1] is not None:
+            gap_start -= 1
+        body = [line for line, kind in rows[:gap_start]]
+        if statement["kind"] == "docstring":
+            docstring_lines = get_docstring_lines(statement["string"])
+            if docstring_lines is not None:
+                out += flush()
+                out.append(("markdown", docstring_lines))
+            else:
+                cell["lines"].extend(body)
+        else:
+            cell["lines"].extend(body)
+        out += place_gap(rows[gap_start:], next_kind, False)
+        return out
+
+    statement = {"row": None, "kind": None, "string": ""}
+    depth = 0
+    at_line_start = True
+    last_row = 0
+    pending_docstring = False
+    try:
+        for token in tokenize.generate_tokens(readline):
+            tok_type, tok_string, (srow, scol), (erow, ecol), _ = token
+            if pending_docstring and tok_type != tokenize.COMMENT:
+                # A docstring is a string followed by the end of the line
+                if tok_type != tokenize.NEWLINE:
+                    statement["kind"] = "code"
+                pending_docstring = False
+            first_on_row = srow > last_row
+
+            if tok_type == tokenize.COMMENT:
+                if first_on_row and depth == 0 and scol == 0:
+                    kinds[srow] = "comment"
+            elif tok_type == tokenize.NL:
+                if first_on_row and depth == 0:
+                    kinds[srow] = "blank"
+            elif tok_type == tokenize.ENDMARKER:
+                yield from start_statement(srow, None)
+            elif tok_type not in (tokenize.NEWLINE, tokenize.INDENT,
+                    tokenize.DEDENT):
+                if at_line_start and depth == 0 and scol == 0:
+                    if statement["row"] is None and tok_type == tokenize.STRING:
+                        next_kind = "docstring"
+                        pending_docstring = True
+                    elif tok_string == "@":
+                        next_kind = "decorator"
+                    elif tok_string in ("def", "class", "async"):
+                        next_kind = "def"
+                    else:
+                        next_kind = "code"
+                    yield from start_statement(srow, next_kind)
+                    statement.update({"row": srow, "kind": next_kind,
+                            "string": tok_string})
+                if tok_type == tokenize.OP:
+                    if tok_string in "([{":
+                        depth += 1
+                    elif tok_string in ")]}":
+                        depth -= 1
+                at_line_start = False
+
+            if tok_type == tokenize.NEWLINE:
+                at_line_start = True
+            if tok_type not in (tokenize.INDENT, tokenize.DEDENT,
+                    tokenize.ENDMARKER):
+                last_row = erow
+    except (tokenize.TokenError, SyntaxError):
+        # Can't be tokenized. The rest of the file goes in one code cell.
+        if cell["type"] == "markdown":
+            yield from flush()
+        cell["lines"].extend(buffer)
+        cell["lines"].extend(fin)
+
+    yield from flush()
+
+
+def txt_cells(text_file, parser="lines", stats=None):
+    # Generator. Yield the cell dictionaries for the txt file as it is read
+    yield from new_cells(process_text_file(text_file, parser, stats))
+
+
+def new_cells(parsed_cells):
+    # Generator. Yield the cell dictionary of each (cell_type, source_lines)
+    for cell_type, source_lines in parsed_cells:
+        cell_dict = new_cell(cell_type, source_lines)
+        if cell_dict is not None:
+            yield cell_dict
+
+
+def py_cells(py_file, ipynb_filename, split_mode="", stats=None):
+    # Generator. Cell 0 is a markdown heading with the python program name
+    # and cell 1 is the python program as a code cell. With a split_mode of
+    # "markers" or "defs" the program is split into cells by parse_py_lines().
+    with open(py_file, "r") as fin:
+        yield from py_stream_cells(fin, ipynb_filename, split_mode, stats)
+
+
+def py_stream_cells(fin, ipynb_filename, split_mode="", stats=None):
+    # Generator. The cells of py_cells() from a python program open as fin
+    yield new_markdown_cell(split_source(get_heading_text(ipynb_filename)))
+    phase = stats.phase if stats is not None else null_phase
+    if not split_mode:
+        with phase("read"):
+            py_lines = fin.readlines()
+        yield new_code_cell(py_lines)
+        return
+    cells = parse_py_lines(fin if stats is None else TimedFile(fin, stats),
+            split_mode)
+    if stats is not None:
+        cells = stats.timed(cells, "parse")
+    yield from new_cells(cells)
+
+
+def convert_txt_file(text_file, report=print, ipynb_filename=None,
+        options=None, stats=None):
+    # Process a txt file to ipynb file. Progress messages are passed to report.
+    options = get_options(options)
+    if ipynb_filename is None:
+        ipynb_filename = get_ipynb_filename(text_file)
+    cell_total = write_notebook(ipynb_filename,
+            txt_cells(text_file, options["parser"], stats), options, report,
+            stats)
+    report("Total cells in ipynb file: {}".format(cell_total))
+
+
+def convert_py_file(py_file, report=print, ipynb_filename=None,
+        options=None, stats=None):
+    # Process a py file to ipynb file. Progress messages are passed to report.
+    options = get_options(options)
+    if ipynb_filename is None:
+        ipynb_filename = get_ipynb_filename(py_file)
+    cell_total = write_notebook(ipynb_filename,
+            py_cells(py_file, ipynb_filename, options["split_py"], stats),
+            options, report, stats)
+    if options["split_py"]:
+        report("Total cells in ipynb file: {}".format(cell_total))
+
+
+class JsonStream:
+    # A pull parser that reads json from a text file in chunks. Values can be
+    # read, or skipped without building them. A skipped string is scanned for
+    # its closing quote and dropped a chunk at a time, so skipping the base64
+    # images in the outputs of a notebook needs only one chunk of memory.
+    #
+    # stream = JsonStream(f)
+    # for key in stream.object_keys():
+    #     if key == "wanted":
+    #         value = stream.value()
+    #     else:
+    #         stream.skip_value()
+
+    def __init__(self, f, chunk_size=JSON_CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+
+    def fill(self, need=1):
+        # Read until need characters are available from pos. False at the end
+        # of the file.
+        while len(self.buffer) - self.pos < need:
+            chunk = self.f.read(self.chunk_size)
+            if not chunk:
+                return False
+            self.buffer = self.buffer[self.pos:] + chunk
+            self.pos = 0
+        return True
+
+    def discard(self):
+        # Drop the buffered text, which has been scanned, and read more
+        self.buffer = ""
+        self.pos = 0
+        if not self.fill():
+            raise ValueError("Unexpected end of json file")
+
+    def peek(self):
+        # Skip white space and return the next character without using it
+        while True:
+            if not self.fill():
+                raise ValueError("Unexpected end of json file")
+            self.pos = JSON_SPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError("Expected {} in json file, found {}"
+                    .format(char, found))
+        self.pos += 1
+
+    def string(self, keep=True):
+        # Read a string. With keep False the string is only scanned.
+        self.expect('"')
+        parts = []
+        while True:
+            match = JSON_STRING_SPECIAL.search(self.buffer, self.pos)
+            if match is None:
+                if keep:
+                    parts.append(self.buffer[self.pos:])
+                self.discard()
+                continue
+            if keep:
+                parts.append(self.buffer[self.pos:match.start()])
+            self.pos = match.start()
+            if match.group() == '"':
+                self.pos += 1
+                break
+            # An escape. \uXXXX is 6 characters, the others are 2.
+            self.fill(6)
+            length = 6 if self.buffer[self.pos + 1:self.pos + 2] == "u" else 2
+            if keep:
+                parts.append(self.buffer[self.pos:self.pos + length])
+            self.pos += length
+        if keep:
+            # json decodes the escapes, including surrogate pairs
+            return json.loads('"' + "".join(parts) + '"')
+        return None
+
+    def scalar(self):
+        # Read a number, true, false or null
+        self.peek()
+        while True:
+            match = JSON_SCALAR_END.search(self.buffer, self.pos)
+            if match is not None:
+                break
+            # The scalar may continue in the next chunk
+            chunk = self.f.read(self.chunk_size)
+            if not chunk:
+                match = None
+                break
+            self.buffer = self.buffer[self.pos:] + chunk
+            self.pos = 0
+        end = match.start() if match is not None else len(self.buffer)
+        text = self.buffer[self.pos:end]
+        self.pos = end
+        return json.loads(text)
+
+    def object_keys(self):
+        # Generator. Yield each key of an object. The caller must read or
+        # skip the value of each key before asking for the next key.
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.string()
+            self.expect(":")
+            yield key
+            found = self.peek()
+            self.pos += 1
+            if found == "}":
+                return
+            if found != ",":
+                raise ValueError("Expected , or }} in json file, found {}"
+                        .format(found))
+
+    def array_items(self):
+        # Generator. Yield the index of each item of an array. The caller must
+        # read or skip each item.
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        index = 0
+        while True:
+            yield index
+            index += 1
+            found = self.peek()
+            self.pos += 1
+            if found == "]":
+                return
+            if found != ",":
+                raise ValueError("Expected , or ] in json file, found {}"
+                        .format(found))
+
+    def value(self):
+        # Read a value of any type
+        found = self.peek()
+        if found == '"':
+            return self.string()
+        if found == "{":
+            return {key: self.value() for key in self.object_keys()}
+        if found == "[":
+            return [self.value() for index in self.array_items()]
+        return self.scalar()
+
+    def skip_value(self):
+        # Skip a value of any type without building it
+        found = self.peek()
+        if found == '"':
+            self.string(keep=False)
+            return
+        if found not in "{[":
+            self.scalar()
+            return
+        depth = 0
+        while True:
+            match = JSON_CONTAINER_SPECIAL.search(self.buffer, self.pos)
+            if match is None:
+                self.discard()
+                continue
+            self.pos = match.start()
+            found = match.group()
+            if found == '"':
+                self.string(keep=False)
+                continue
+            self.pos += 1
+            if found in "{[":
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return
+
+
+def iter_ipynb_cells(f):
+    # Generator. Yield (cell_type, source_text, metadata) for each cell of a
+    # notebook file, read with JsonStream. The outputs, attachments and all
+    # other keys are skipped without being loaded.
+    stream = JsonStream(f)
+    for key in stream.object_keys():
+        if key != "cells":
+            stream.skip_value()
+            continue
+        for index in stream.array_items():
+            cell = {"cell_type": "code", "source": "", "metadata": {}}
+            for cell_key in stream.object_keys():
+                if cell_key in cell:
+                    cell[cell_key] = stream.value()
+                else:
+                    stream.skip_value()
+            source = cell["source"]
+            if isinstance(source, list):
+                source = "".join(source)
+            yield cell["cell_type"], source, cell["metadata"]
+
+
+def get_extract_filename(ipynb_file, extension):
+    # The .txt or .py file name for an ipynb file. E.g. hello.ipynb hello.txt
+    return os.path.splitext(ipynb_file)[0] + "." + extension
+
+
+def format_txt_cell(cell_type, source, metadata=None):
+    # A cell in the delimited text format, read back by process_text_file().
+    # The format of a raw cell is kept, e.g. <raw text/html>
+    if source and not source.endswith("\n"):
+        source = source + "\n"
+    if (cell_type == "raw" and isinstance(metadata, dict)
+            and isinstance(metadata.get("format"), str)
+            and RAW_FORMAT.match(metadata["format"])):
+        cell_type = "raw " + metadata["format"]
+    return "<{}>\n{}".format(cell_type, source)
+
+
+def format_py_cell(cell_type, source):
+    # A cell in the "# %%" format, read back by --split-py markers. Markdown
+    # and raw cells are written as comments.
+    if source and not source.endswith("\n"):
+        source = source + "\n"
+    if cell_type == "code":
+        return "# %%\n{}\n".format(source)
+    lines = [("# " + line).rstrip(" \n") + "\n"
+            for line in split_source(source)]
+    return "# %% [{}]\n{}\n".format(cell_type, "".join(lines))
+
+
+def extract_ipynb_file(ipynb_file, extension="txt", report=print,
+        overwrite=False):
+    # Write the source of each cell of the ipynb file to a .txt file with
+    # <markdown>, <code> and <raw> delimiters, or to a .py file. The file is
+    # written through a temporary file and renamed into place.
+    out_filename = get_extract_filename(ipynb_file, extension)
+    if os.path.exists(out_filename) and not overwrite:
+        raise FileExistsError("{} already exists. Use --force to replace it."
+                .format(out_filename))
+    report("{} file created: {}".format(extension, out_filename))
+    cell_total = 0
+    delimiter_total = 0
+    f, temp_filename = create_temp_file(out_filename)
+    try:
+        if extension == "txt":
+            f.write("<comment Extracted from {} by ipynb-creator>\n"
+                    .format(os.path.basename(ipynb_file)))
+        with open(ipynb_file, "r", encoding="utf-8") as fin:
+            for cell_type, source, metadata in iter_ipynb_cells(fin):
+                if extension == "txt":
+                    f.write(format_txt_cell(cell_type, source, metadata))
+                    delimiter_total += sum(1 for line in split_source(source)
+                            if line.startswith("<"))
+                else:
+                    f.write(format_py_cell(cell_type, source))
+                cell_total += 1
+    except BaseException:
+        discard_temp_file(f, temp_filename)
+        raise
+    finish_temp_file(f, temp_filename, out_filename)
+    report("Total cells extracted: {}".format(cell_total))
+    if delimiter_total:
+        report("Warning: {} lines start with < and will be read as "
+                "delimiters when {} is converted.".format(delimiter_total,
+                out_filename))
+
+
+def main_extract_files(file_list, options):
+    # Extract each ipynb file to a .txt or .py file
+    for file_name in file_list:
+        if not has_extension(file_name, ("ipynb",)):
+            sys.exit("Must be an .ipynb file. File {} is not valid."
+                    .format(file_name))
+    for file_name in file_list:
+        try:
+            extract_ipynb_file(file_name, options["to"], print,
+                    options["force"])
+        except (OSError, ValueError) as e:
+            sys.exit("Error extracting {}: {}".format(file_name, e))
+
+
+def main_txt_files(options=None):
+    print(HEADING_TXT)
+
+    extension = "txt"
+    text_list = select_files(extension)
+    print("Text files to be used to create ipynb files: {}".format(
+            format_selection(text_list)))
+
+    main_with_files(text_list, options)
+
+
+def main_py_files(options=None):
+    # Use a python program to create a Jupyter notebook
+    # Options cell0 can be a markdown with python program name (and comments?)
+    print(HEADING_PY)
+
+    extension = "py"
+    py_list = select_files(extension)
+    print("Python files to be used to create ipynb files: {}".format(
+            format_selection(py_list)))
+
+    main_with_files(py_list, options)
+
+
+def convert_text(text):
+    # Library use. Convert the text of a delimited text file to a notebook
+    # dictionary. Nothing is read from or written to disk.
+    data = new_notebook()
+    # newline=None reads "\r\n" line ends the same as a text file does
+    for cell_type, source_lines in parse_text_lines(io.StringIO(text,
+            newline=None)):
+        add_cell(data, cell_type, source_lines)
+    return data
+
+
+def convert_py(text, name="program", split_py=""):
+    # Library use. Convert the text of a python program to a notebook
+    # dictionary. name is used for the heading in cell 0, as the file name
+    # would be. split_py may be "markers" or "defs" as for --split-py.
+    data = new_notebook()
+    add_cell(data, "markdown", split_source(get_heading_text(name + ".ipynb")))
+    fin = io.StringIO(text, newline=None)
+    if not split_py:
+        add_cell(data, "code", fin.readlines())
+        return data
+    for cell_type, source_lines in parse_py_lines(fin, split_py):
+        add_cell(data, cell_type, source_lines)
+    return data
+
+
+def dumps_notebook(data, options=None):
+    # Library use. Return the notebook dictionary as text, the same as the
+    # ipynb file written for it. Encode as utf-8 for bytes. options may set
+    # the json format as the command line options do, the others keep their
+    # defaults. E.g. {"json_backend": "orjson", "compact": True}
+    return get_json_dumps(options)(data)
+
+
+class ConversionStats:
+    # --stats. The time spent in each phase of converting one file, the bytes
+    # read and written and the number of cells of each type. As the cells
+    # stream through, the phases take turns a cell at a time. The phase
+    # being timed is kept on a stack, so while e.g. parse waits on read only
+    # read is timed. The time of each phase excludes the phases within it.
+
+    def __init__(self, file_name, bytes_in=None):
+        self.file_name = file_name
+        self.seconds = dict.fromkeys(STATS_PHASES, 0.0)
+        # The size of stdin is not known. A file in an archive is not on
+        # disk, its size is passed in.
+        if bytes_in is None:
+            bytes_in = (0 if file_name == STDIO_NAME
+                    else os.path.getsize(file_name))
+        self.bytes_in = bytes_in
+        self.bytes_out = 0
+        self.cells = {}
+        self.stack = []
+        self.start = self.last = time.perf_counter()
+
+    def switch(self):
+        # Add the time since the last switch to the phase being timed
+        now = time.perf_counter()
+        if self.stack:
+            self.seconds[self.stack[-1]] += now - self.last
+        self.last = now
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        self.switch()
+        self.stack.append(name)
+        try:
+            yield
+        finally:
+            self.switch()
+            self.stack.pop()
+
+    def timed(self, iterable, name):
+        # Generator. Yield the items of iterable, timing each next() as the
+        # phase name
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name):
+                item = next(iterator, STATS_END)
+            if item is STATS_END:
+                return
+            yield item
+
+    def count_cell(self, cell_type):
+        self.cells[cell_type] = self.cells.get(cell_type, 0) + 1
+
+    def finish(self):
+        # The stats as a dictionary, which can be returned from a worker
+        # process and written as json. "other" is the time not in a phase.
+        record = {"file": self.file_name}
+        record.update((name, round(seconds, 6))
+                for name, seconds in self.seconds.items())
+        total = time.perf_counter() - self.start
+        record["other"] = round(max(0.0, total - sum(self.seconds.values())), 6)
+        record["total"] = round(total, 6)
+        record["bytes_in"] = self.bytes_in
+        record["bytes_out"] = self.bytes_out
+        record["cells"] = dict(sorted(self.cells.items()))
+        record["peak_rss_kb"] = get_peak_rss()
+        return record
+
+
+class TimedFile:
+    # A file whose readline() is timed as the read phase of stats. For
+    # parse_py_lines(), which reads with readline().
+
+    def __init__(self, f, stats):
+        self.f = f
+        self.stats = stats
+
+    def readline(self):
+        with self.stats.phase("read"):
+            return self.f.readline()
+
+
+def null_phase(name):
+    # The phase timer used without --stats, which times nothing
+    return NULL_CONTEXT
+
+
+def get_peak_rss(children=False):
+    # The peak resident set size in kB of this process, or of its largest
+    # child process. None where the resource module is not available.
+    try:
+        import resource
+    except ImportError:
+        return None
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    peak = resource.getrusage(who).ru_maxrss
+    if sys.platform == "darwin":
+        # Reported in bytes rather than kB
+        peak //= 1024
+    return peak
+
+
+def get_stats_total(stats_list, seconds):
+    # Add up the stats of the files. seconds is the time of the whole run.
+    total = {"file": None, "files": len(stats_list)}
+    for name in STATS_PHASES + ("other", "total"):
+        total[name] = round(sum(record[name] for record in stats_list), 6)
+    total["wall"] = round(seconds, 6)
+    total["bytes_in"] = sum(record["bytes_in"] for record in stats_list)
+    total["bytes_out"] = sum(record["bytes_out"] for record in stats_list)
+    cells = {}
+    for record in stats_list:
+        for cell_type, count in record["cells"].items():
+            cells[cell_type] = cells.get(cell_type, 0) + count
+    total["cells"] = dict(sorted(cells.items()))
+    peak_list = [record["peak_rss_kb"] for record in stats_list] + [
+            get_peak_rss(), get_peak_rss(children=True)]
+    peak_list = [peak for peak in peak_list if peak is not None]
+    total["peak_rss_kb"] = max(peak_list) if peak_list else None
+    return total
+
+
+def format_stats(stats_list, total):
+    # The human readable summary of --stats
+    lines = ["", "Stats for {} files, {:.3f} seconds:".format(total["files"],
+            total["wall"])]
+    busy = total["total"] or 1e-9
+    for name in STATS_PHASES + ("other",):
+        lines.append("   {:<10} {:>10.4f} s {:>6.1%}".format(name, total[name],
+                total[name] / busy))
+    lines.append("   bytes in {:,}, bytes out {:,}"
+            .format(total["bytes_in"], total["bytes_out"]))
+    lines.append("   cells: {}".format(", ".join("{} {}".format(cell_type,
+            count) for cell_type, count in total["cells"].items()) or "none"))
+    if total["peak_rss_kb"] is not None:
+        lines.append("   peak RSS: {:,} kB".format(total["peak_rss_kb"]))
+    slowest = sorted(stats_list, key=lambda record: record["total"],
+            reverse=True)[:STATS_SLOWEST]
+    if len(stats_list) > 1:
+        lines.append("Slowest files:")
+        for record in slowest:
+            lines.append("   {:>10.4f} s  {}".format(record["total"],
+                    record["file"]))
+    return "\n".join(lines)
+
+
+def report_stats(stats_list, seconds, options, stream=None):
+    # Print the --stats of the run, to stream or stdout, or write them to
+    # --stats-file. As json lines there is one line for each file then one
+    # line of the totals, whose "file" is null.
+    total = get_stats_total(stats_list, seconds)
+    if options["stats_format"] == "jsonl":
+        text = "".join(json.dumps(record) + "\n"
+                for record in stats_list + [total])
+    else:
+        text = format_stats(stats_list, total) + "\n"
+    if options["stats_file"]:
+        with open(options["stats_file"], "w") as f:
+            f.write(text)
+    else:
+        (stream or sys.stdout).write(text)
+
+
+def convert_file(file_name, report=print, ipynb_filename=None, options=None):
+    # Convert a .txt or a .py file to an ipynb file. The ipynb file name is
+    # made from file_name unless one is provided. With --stats returns the
+    # stats of the conversion as a dictionary, otherwise None.
+    options = get_options(options)
+    stats = None
+    if options["stats"]:
+        stats = ConversionStats(file_name)
+    if file_name.split(".")[-1] == "txt":
+        convert_txt_file(file_name, report, ipynb_filename, options, stats)
+    else:
+        convert_py_file(file_name, report, ipynb_filename, options, stats)
+    if stats is not None:
+        return stats.finish()
+    return None
+
+
+def convert_file_job(job):
+    # Runs in a worker process. job is (file_name, ipynb_filename, options).
+    # Convert one file and return its messages, any error and its --stats
+    # so the parent process can report them in file list order.
+    file_name, ipynb_filename, options = job
+    messages = []
+    if file_name.split(".")[-1] not in ("txt", "py"):
+        return file_name, messages, "Must be a .txt or .py file.", None
+    try:
+        stats = convert_file(file_name, messages.append, ipynb_filename,
+                options)
+    except Exception as e:
+        return file_name, messages, "{}: {}".format(type(e).__name__, e), None
+    return file_name, messages, None, stats
+
+
+def get_chunksize(file_total, jobs):
+    # Hand the workers several files at a time to reduce the pickling overhead,
+    # but keep the chunks small enough for the work to stay balanced.
+    return max(1, min(64, file_total // (jobs * 4)))
+
+
+def main_with_files_parallel(file_list, jobs, output_map=None, options=None):
+    # Convert the files over a pool of worker processes. Results come back in
+    # file list order so the output is the same for every run. A bad file is
+    # reported and the remaining files are still converted. Returns the list
+    # of the files that failed and the list of the --stats of the others.
+    # Imported here, as only --jobs needs it, to keep the library import fast
+    import concurrent.futures
+    job_list = [(file_name, get_output_filename(file_name, output_map),
+            options) for file_name in file_list]
+    chunksize = get_chunksize(len(file_list), jobs)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        failed_list, stats_list = report_job_results(executor.map(
+                convert_file_job, job_list, chunksize=chunksize))
+
+    print("\nConverted {} of {} files using {} jobs. {} failed."
+            .format(len(file_list) - len(failed_list), len(file_list), jobs,
+            len(failed_list)))
+    return failed_list, stats_list
+
+
+def main_with_files_threaded(file_list, in_flight, output_map=None,
+        options=None):
+    # --in-flight N. Convert up to N files at once on a pool of threads, so
+    # the waits of one file's open, read, write and fsync overlap with the
+    # work on the others. For network file systems, where each call waits
+    # on a round trip rather than the CPU. Files are submitted only as the
+    # oldest result is taken, so at most N are in flight and memory stays
+    # bounded. Results are reported in file list order. Returns the list of
+    # the files that failed and the list of the --stats of the others.
+    # Imported here, as only --in-flight needs them
+    import collections
+    import concurrent.futures
+    get_umask()
+
+    def iter_results(executor):
+        # Generator. The results in order, with at most in_flight pending
+        pending = collections.deque()
+        for file_name in file_list:
+            if len(pending) >= in_flight:
+                yield pending.popleft().result()
+            pending.append(executor.submit(convert_file_job, (file_name,
+                    get_output_filename(file_name, output_map), options)))
+        while pending:
+            yield pending.popleft().result()
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=in_flight)
+    with executor:
+        failed_list, stats_list = report_job_results(iter_results(executor))
+
+    print("\nConverted {} of {} files with {} in flight. {} failed."
+            .format(len(file_list) - len(failed_list), len(file_list),
+            in_flight, len(failed_list)))
+    return failed_list, stats_list
+
+
+def report_file_error(file_name, error):
+    # Print the error of a file that failed to convert, after the messages
+    # printed so far
+    sys.stdout.flush()
+    print("Error converting {}: {}".format(file_name, error), file=sys.stderr)
+    sys.stderr.flush()
+
+
+def report_job_results(results):
+    # Print the messages and errors of the results of convert_file_job() as
+    # they arrive. Returns the list of the files that failed and the list of
+    # the --stats of the others.
+    failed_list = []
+    stats_list = []
+    for file_name, messages, error, stats in results:
+        for message in messages:
+            print(message)
+        if error is not None:
+            failed_list.append(file_name)
+            report_file_error(file_name, error)
+        elif stats is not None:
+            stats_list.append(stats)
+    return failed_list, stats_list
+
+
+def get_settings_key(options):
+    # The converter version, the python version, which is written into the
+    # notebook metadata, and the options that change the ipynb output. A
+    # cached conversion made with different settings is out of date.
+    settings = {"version": VERSION,
+            "python": NOTEBOOK_METADATA["language_info"]["version"]}
+    for key in OUTPUT_OPTIONS:
+        settings[key] = options[key]
+    return json.dumps(settings, sort_keys=True)
+
+
+def get_file_hash(file_name):
+    # sha256 of the file contents, read in blocks
+    sha = hashlib.sha256()
+    with open(file_name, "rb") as f:
+        for block in iter(lambda: f.read(CACHE_BLOCK_SIZE), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def get_file_stat(file_name):
+    # Return [mtime_ns, size] of the file, or None if it doesn't exist
+    try:
+        st = os.stat(file_name)
+    except FileNotFoundError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def load_manifest():
+    # Read the build cache manifest from the current directory.
+    # Returns a dictionary of source file name to its cache entry.
+    try:
+        with open(CACHE_FILENAME, "r") as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except ValueError:
+        print("Build cache {} is damaged. Rebuilding all files."
+                .format(CACHE_FILENAME))
+        return {}
+    if manifest.get("format") != CACHE_FORMAT:
+        return {}
+    return manifest["entries"]
+
+
+def save_manifest(entries):
+    # Write the manifest to a temporary file and then rename it over the old
+    # manifest so an interrupted run never leaves a damaged cache behind.
+    temp_filename = CACHE_FILENAME + ".tmp"
+    with open(temp_filename, "w") as f:
+        json.dump({"format": CACHE_FORMAT, "entries": entries}, f, indent=1)
+    os.replace(temp_filename, CACHE_FILENAME)
+
+
+def clean_cache():
+    # Remove the build cache manifest
+    try:
+        os.remove(CACHE_FILENAME)
+        print("Build cache {} removed.".format(CACHE_FILENAME))
+    except FileNotFoundError:
+        print("No build cache {} to remove.".format(CACHE_FILENAME))
+
+
+def is_up_to_date(entries, file_name, settings, ipynb_filename=None):
+    # True if the ipynb file made from file_name is still current. The fast
+    # path only stats the files. The source is hashed only when its stat has
+    # changed, so touching a file without editing it does not rebuild it.
+    entry = entries.get(os.path.normpath(file_name))
+    if entry is None or entry["settings"] != settings:
+        return False
+    if ipynb_filename is None:
+        ipynb_filename = get_ipynb_filename(file_name)
+    if (entry["output"] != ipynb_filename
+            or get_file_stat(ipynb_filename) != entry["output_stat"]):
+        # The ipynb file was removed or edited since it was created.
+        return False
+    if not are_includes_up_to_date(entry):
+        return False
+    source_stat = get_file_stat(file_name)
+    if source_stat == entry["source_stat"]:
+        return True
+    if source_stat is None or get_file_hash(file_name) != entry["sha256"]:
+        return False
+    entry["source_stat"] = source_stat
+    return True
+
+
+def get_include_hash(path, file_stat):
+    # sha256 of an included file, hashed once per [mtime_ns, size] as many
+    # sources may include it
+    key = (path, tuple(file_stat))
+    if key not in INCLUDE_HASH_CACHE:
+        INCLUDE_HASH_CACHE[key] = get_file_hash(path)
+    return INCLUDE_HASH_CACHE[key]
+
+
+def find_includes(file_name):
+    # The real paths of the files a .txt file includes, directly or not.
+    # Only the include delimiters are looked at, the included .txt files
+    # are read through INCLUDE_CACHE.
+    include = IncludeReader(file_name)
+    if has_extension(file_name, ("txt",)):
+        with open(file_name, "r") as fin:
+            for line in fin:
+                if (line.startswith("<") and "include" in line
+                        and get_delimiter_keyword(line) == "include"):
+                    include(line)
+    return include.files
+
+
+def are_includes_up_to_date(entry):
+    # True if none of the files included by the source of entry changed.
+    # As for the source, an included file is hashed only when its stat has
+    # changed.
+    includes = entry.get("includes", {})
+    for path, (file_stat, sha256) in includes.items():
+        current_stat = get_file_stat(path)
+        if current_stat == file_stat:
+            continue
+        if (current_stat is None
+                or get_include_hash(path, current_stat) != sha256):
+            return False
+        includes[path] = [current_stat, sha256]
+    return True
+
+
+def record_conversion(entries, file_name, settings, ipynb_filename=None):
+    # Store the cache entry for a file that has just been converted
+    if ipynb_filename is None:
+        ipynb_filename = get_ipynb_filename(file_name)
+    entries[os.path.normpath(file_name)] = {
+            "source_stat": get_file_stat(file_name),
+            "sha256": get_file_hash(file_name),
+            "settings": settings,
+            "output": ipynb_filename,
+            "output_stat": get_file_stat(ipynb_filename),
+            "includes": dict((path, [get_file_stat(path),
+                get_include_hash(path, get_file_stat(path))])
+                for path in sorted(find_includes(file_name)))}
+
+
+def match_patterns(path, pattern_list):
+    # True if the path matches any of the shell style patterns. E.g. "*.txt"
+    return any(fnmatch.fnmatchcase(path, pattern) for pattern in pattern_list)
+
+
+def scan_tree(root_list, options):
+    # Walk each root directory once with os.scandir, a directory at a time,
+    # and collect the .txt and .py files. Paths relative to the root are
+    # matched against the --include and --exclude patterns. An excluded
+    # directory is not entered. Symbolic links to directories are not
+    # followed. Returns the sorted file list and a dictionary of each file's
+    # ipynb file name, mirroring the tree under --output-dir if provided.
+    include_list = options["include"]
+    exclude_list = options["exclude"]
+    output_dir = options["output_dir"]
+    file_set = set()
+    output_map = {}
+    for root in root_list:
+        if os.path.isfile(root):
+            file_set.add(root)
+            continue
+        stack = [""]
+        while stack:
+            relative_dir = stack.pop()
+            with os.scandir(os.path.join(root, relative_dir)) as it:
+                for entry in it:
+                    relative_path = os.path.join(relative_dir, entry.name)
+                    match_path = relative_path.replace(os.sep, "/")
+                    if match_patterns(match_path, exclude_list):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(relative_path)
+                        continue
+                    if not has_extension(entry.name, ("txt", "py")):
+                        continue
+                    if include_list and not match_patterns(match_path,
+                            include_list):
+                        continue
+                    if root == os.curdir:
+                        file_name = relative_path
+                    else:
+                        file_name = os.path.join(root, relative_path)
+                    if file_name in file_set:
+                        continue
+                    file_set.add(file_name)
+                    if output_dir:
+                        output_map[file_name] = get_ipynb_filename(
+                                os.path.join(output_dir, relative_path))
+    return sorted(file_set), output_map
+
+
+def get_output_filename(file_name, output_map=None):
+    # The ipynb file name for file_name. output_map, from scan_tree(), holds
+    # the names of ipynb files placed in an --output-dir.
+    if output_map is not None and file_name in output_map:
+        return output_map[file_name]
+    return get_ipynb_filename(file_name)
+
+
+def make_output_directories(output_map):
+    # Create each directory of the mirrored tree once, before converting
+    directory_set = set(os.path.dirname(ipynb_filename)
+            for ipynb_filename in output_map.values())
+    for directory in sorted(directory_set):
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+
+def get_archive_type(file_name):
+    # The archive extension of file_name, e.g. ".zip" or ".tar.gz", or None
+    # if it is not an archive
+    lower_name = file_name.lower()
+    for extension in ARCHIVE_EXTENSIONS:
+        if lower_name.endswith(extension):
+            return extension
+    return None
+
+
+def get_archive_name(file_name):
+    # The name of a file within an archive: relative, with "/" separators
+    # and no "..". A name that would lead outside is reduced to its base name.
+    name = posixpath.normpath(file_name.replace(os.sep, "/")).lstrip("/")
+    if name == ".." or name.startswith("../"):
+        name = posixpath.basename(name)
+    return name
+
+
+class ArchiveOutput:
+    # --output-archive. Add the notebooks to one zip or tar file rather than
+    # writing a file for each. NotebookWriter writes each notebook to an
+    # entry from create_entry(), a SpooledTemporaryFile which stays in memory
+    # unless larger than ARCHIVE_SPOOL_SIZE, and add_entry() copies it into
+    # the archive once complete. A tar header needs the size before the data,
+    # and a notebook that fails leaves nothing in the archive. The archive is
+    # written to a temporary file which close() renames into place.
+
+    def __init__(self, archive_filename):
+        # Imported here, as only archives need them
+        import tarfile
+        import zipfile
+        self.archive_filename = archive_filename
+        self.name_set = set()
+        self.f, self.temp_filename = create_temp_file(archive_filename,
+                mode="wb")
+        archive_type = get_archive_type(archive_filename)
+        if archive_type == ".zip":
+            self.zip_file = zipfile.ZipFile(self.f, "w", zipfile.ZIP_DEFLATED)
+            self.tar_file = None
+        else:
+            self.zip_file = None
+            self.tar_file = tarfile.open(fileobj=self.f,
+                    mode=TAR_WRITE_MODES[archive_type])
+
+    def create_entry(self):
+        # A text file for a notebook, to be passed to add_entry() when written
+        spool = tempfile.SpooledTemporaryFile(max_size=ARCHIVE_SPOOL_SIZE)
+        return io.TextIOWrapper(spool, encoding="utf-8")
+
+    def add_entry(self, entry, file_name):
+        # Copy the notebook written to entry into the archive and close entry
+        import shutil
+        import tarfile
+        import zipfile
+        name = get_archive_name(file_name)
+        if name in self.name_set:
+            entry.close()
+            raise ValueError("{} is already in {}".format(name,
+                    self.archive_filename))
+        self.name_set.add(name)
+        entry.flush()
+        spool = entry.buffer
+        size = spool.tell()
+        spool.seek(0)
+        if self.zip_file is not None:
+            info = zipfile.ZipInfo(name, time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = 0o644 << 16
+            with self.zip_file.open(info, "w") as f:
+                shutil.copyfileobj(spool, f)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = size
+            info.mtime = int(time.time())
+            info.mode = 0o644
+            self.tar_file.addfile(info, spool)
+        entry.close()
+
+    def close(self):
+        # Finish the archive and move it into place
+        (self.zip_file or self.tar_file).close()
+        finish_temp_file(self.f, self.temp_filename, self.archive_filename)
+
+    def abort(self):
+        # Discard the archive. An existing archive file is untouched.
+        try:
+            (self.zip_file or self.tar_file).close()
+        except Exception:
+            pass
+        discard_temp_file(self.f, self.temp_filename)
+
+
+class ArchiveMemberReader(io.RawIOBase):
+    # The file of a tar member read as a stream. tarfile's own file can not
+    # be wrapped by io.TextIOWrapper in stream mode, as it has no seekable().
+
+    def __init__(self, f):
+        self.f = f
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.f.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def iter_archive_sources(archive_filename):
+    # Generator. Yield (name, f, size) for each .txt and .py file in a zip or
+    # tar archive, in the order they are stored. f is a binary file that reads
+    # the file out of the archive as it is converted, and is only open until
+    # the next file is yielded. A tar archive, which may be compressed, is
+    # read as a stream from start to end.
+    import tarfile
+    import zipfile
+    if zipfile.is_zipfile(archive_filename):
+        with zipfile.ZipFile(archive_filename) as zip_file:
+            for info in zip_file.infolist():
+                if info.is_dir() or not has_extension(info.filename,
+                        ("txt", "py")):
+                    continue
+                with zip_file.open(info) as f:
+                    yield info.filename, f, info.file_size
+        return
+    with tarfile.open(archive_filename, "r|*") as tar_file:
+        for member in tar_file:
+            if not member.isfile() or not has_extension(member.name,
+                    ("txt", "py")):
+                continue
+            with tar_file.extractfile(member) as f:
+                yield (member.name, io.BufferedReader(ArchiveMemberReader(f)),
+                        member.size)
+
+
+def no_archive_include(delimiter):
+    # <include path> in a file read from an archive. The path would be
+    # relative to a directory that is not on disk.
+    raise ValueError("{} can not be used in a file read from an archive"
+            .format(delimiter.strip()))
+
+
+def convert_stream(name, fin, ipynb_filename, options, report=print,
+        archive=None, include=None, stats=None):
+    # Convert a .txt or .py file that is open as fin, e.g. read from an
+    # archive. As convert_txt_file() and convert_py_file() do for files.
+    # include reads the <include path> delimiters, see IncludeReader.
+    if has_extension(name, ("txt",)):
+        cell_total = write_notebook(ipynb_filename, new_cells(
+                parse_text_stream(fin, include, options["parser"], stats)),
+                options, report, stats, archive)
+        report("Total cells in ipynb file: {}".format(cell_total))
+        return
+    cell_total = write_notebook(ipynb_filename,
+            py_stream_cells(fin, ipynb_filename, options["split_py"], stats),
+            options, report, stats, archive)
+    if options["split_py"]:
+        report("Total cells in ipynb file: {}".format(cell_total))
+
+
+def iter_sources(file_list, options, output_map=None):
+    # Generator. Yield (display_name, source_name, open_source,
+    # ipynb_filename, include, size) for each file to convert. The files in
+    # archives are yielded one by one as the archive is read. open_source()
+    # returns the source opened as text. include reads its <include path>
+    # delimiters, which files in archives can not use. size is the size of
+    # a file in an archive, for --stats, or None for a file on disk.
+    for file_name in file_list:
+        if get_archive_type(file_name) is None:
+            ipynb_filename = get_output_filename(file_name, output_map)
+            if options["output_archive"]:
+                ipynb_filename = get_archive_name(ipynb_filename)
+            yield (file_name, file_name,
+                    lambda file_name=file_name: open(file_name, "r"),
+                    ipynb_filename, IncludeReader(file_name), None)
+            continue
+        for name, f, size in iter_archive_sources(file_name):
+            ipynb_filename = get_ipynb_filename(get_archive_name(name))
+            if not options["output_archive"]:
+                ipynb_filename = os.path.join(options["output_dir"],
+                        *ipynb_filename.split("/"))
+            yield ("{}:{}".format(file_name, name), name,
+                    lambda f=f: io.TextIOWrapper(f), ipynb_filename,
+                    no_archive_include, size)
+
+
+def main_with_archives(file_list, options, output_map=None):
+    # Convert files that are read from zip or tar archives, or written into
+    # one with --output-archive. A file at a time is read and written, so
+    # memory stays bounded however many files there are. A file that fails
+    # is reported and the others are still converted. --stats and --parser
+    # work as for files, but a file read from an archive can not be mapped
+    # into memory and is parsed a line at a time.
+    if options["jobs"] != 1 or options["in_flight"] > 1:
+        sys.exit("Archives are converted a file at a time. --jobs and "
+                "--in-flight can not be used with archives or "
+                "--output-archive.")
+    if options["incremental"] or options["connect"]:
+        sys.exit("--incremental and --connect can not be used with archives "
+                "or --output-archive.")
+    archive = None
+    if options["output_archive"]:
+        archive = ArchiveOutput(options["output_archive"])
+    source_total = 0
+    failed_list = []
+    stats_list = []
+    start = time.perf_counter()
+    try:
+        for (display_name, name, open_source, ipynb_filename, include,
+                size) in iter_sources(file_list, options, output_map):
+            source_total += 1
+            if archive is None and os.path.dirname(ipynb_filename):
+                os.makedirs(os.path.dirname(ipynb_filename), exist_ok=True)
+            stats = None
+            try:
+                if options["stats"]:
+                    stats = ConversionStats(display_name, size)
+                with open_source() as fin:
+                    convert_stream(name, fin, ipynb_filename, options, print,
+                            archive, include, stats)
+                if stats is not None:
+                    stats_list.append(stats.finish())
+            except Exception as e:
+                failed_list.append(display_name)
+                sys.stdout.flush()
+                print("Error converting {}: {}: {}".format(display_name,
+                        type(e).__name__, e), file=sys.stderr)
+                sys.stderr.flush()
+    except BaseException:
+        if archive is not None:
+            archive.abort()
+        raise
+    if archive is not None:
+        archive.close()
+        where = " into {}".format(options["output_archive"])
+    else:
+        where = ""
+
+    print("\nConverted {} of {} files{}. {} failed.".format(
+            source_total - len(failed_list), source_total, where,
+            len(failed_list)))
+    if options["stats"]:
+        report_stats(stats_list, time.perf_counter() - start, options)
+    if failed_list:
+        sys.exit(1)
+
+
+def convert_stdin(options):
+    # A file argument of "-". Read the source from stdin and write the
+    # notebook to stdout, a cell at a time, so the command can be used in a
+    # pipeline. --type sets whether it is delimited text or a python program
+    # and --name the name in the heading cell of a python program. Messages
+    # go to stderr.
+    for key in ("max_cells", "max_bytes", "output_archive", "incremental",
+            "watch", "connect", "update", "execute"):
+        if options[key]:
+            sys.exit("--{} can not be used when writing to stdout."
+                    .format(key.replace("_", "-")))
+    report = functools.partial(print, file=sys.stderr)
+    stats = ConversionStats(STDIO_NAME) if options["stats"] else None
+    start = time.perf_counter()
+    # newline=None reads "\r\n" line ends the same as a text file does
+    fin = io.TextIOWrapper(sys.stdin.buffer, encoding=sys.stdin.encoding,
+            errors=sys.stdin.errors, newline=None)
+    if options["type"] == "py":
+        cells = py_stream_cells(fin, options["name"] + ".ipynb",
+                options["split_py"], stats)
+    elif stats is not None:
+        cells = new_cells(stats.timed(parse_text_lines(stats.timed(fin,
+                "read"), IncludeReader()), "parse"))
+    else:
+        cells = new_cells(parse_text_lines(fin, IncludeReader()))
+    if stats is not None:
+        cells = stats.timed(cells, "build")
+    try:
+        cell_total = write_ipynb(STDIO_NAME, cells, options, stats)
+    except ValueError as e:
+        sys.exit("Error converting -: {}".format(e))
+    except BrokenPipeError:
+        # The reader of stdout went away. Stop without a traceback, also
+        # when python flushes stdout on exit.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
+    report("Total cells in notebook: {}".format(cell_total))
+    if stats is not None:
+        report_stats([stats.finish()], time.perf_counter() - start, options,
+                sys.stderr)
+
+
+def main_with_files(file_list, options=None, output_map=None):
+    #print("List of files is:\n{}".format(file_list))
+    options = get_options(options)
+
+    if options["output_archive"] or any(get_archive_type(file_name)
+            for file_name in file_list):
+        main_with_archives(file_list, options, output_map)
+        return
+
+    jobs = options["jobs"]
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+
+    if jobs == 1:
+        # Files must have .txt or .py extensions
+        for file_name in file_list:
+            if file_name.split(".")[-1] == "txt" or file_name.split(".")[-1] == "py":
+                #print(file_name)
+                pass
+            else:
+                sys.exit("Must be a .txt or .py file. File {} is not valid."
+                        .format(file_name))
+
+    # With --incremental skip the files whose source and settings are the same
+    # as when their ipynb file was created. --force rebuilds every file but
+    # still records them in the build cache.
+    entries = None
+    if options["incremental"] or options["force"]:
+        entries = load_manifest()
+        settings = get_settings_key(options)
+        if not options["force"]:
+            stale_list = [file_name for file_name in file_list
+                    if not is_up_to_date(entries, file_name, settings,
+                    get_output_filename(file_name, output_map))]
+            print("{} of {} files are up to date."
+                    .format(len(file_list) - len(stale_list), len(file_list)))
+            file_list = stale_list
+
+    # file_list has checked out as OK. Proceed with processing each file on list.
+    if output_map is not None:
+        make_output_directories(output_map)
+    if options["execute"] and jobs == 1 and file_list:
+        get_kernel_pool(options).start()
+    converted_list = []
+    failed_list = []
+    stats_list = []
+    start = time.perf_counter()
+    try:
+        if options["connect"] or jobs > 1 or options["in_flight"] > 1:
+            if options["connect"]:
+                failed_list, stats_list = main_with_files_remote(file_list,
+                        output_map, options)
+            elif jobs > 1:
+                failed_list, stats_list = main_with_files_parallel(file_list,
+                        jobs, output_map, options)
+            else:
+                failed_list, stats_list = main_with_files_threaded(
+                        file_list, options["in_flight"], output_map, options)
+            failed_set = set(failed_list)
+            converted_list = [file_name for file_name in file_list
+                    if file_name not in failed_set]
+        else:
+            # A file that fails is reported, as with --jobs, and the others
+            # are still converted
+            for file_name in file_list:
+                try:
+                    stats = convert_file(file_name, print,
+                            get_output_filename(file_name, output_map),
+                            options)
+                except Exception as e:
+                    failed_list.append(file_name)
+                    report_file_error(file_name, "{}: {}".format(
+                            type(e).__name__, e))
+                    continue
+                converted_list.append(file_name)
+                if stats is not None:
+                    stats_list.append(stats)
+    finally:
+        if entries is not None:
+            for file_name in converted_list:
+                record_conversion(entries, file_name, settings,
+                        get_output_filename(file_name, output_map))
+            save_manifest(entries)
+
+    if options["stats"]:
+        report_stats(stats_list, time.perf_counter() - start, options)
+    if failed_list:
+        sys.exit(1)
+
+
+def get_watched_path(directory, name):
+    # The path of a file in a watched directory. A file in the current
+    # directory is its bare name, as file arguments are after normpath().
+    if directory == os.curdir:
+        return name
+    return os.path.join(directory, name)
+
+
+def get_inotify_reader(directory_list):
+    # Linux only. Use inotify, through ctypes, to be told when a file in one
+    # of the directories has been written or renamed into place. Returns a
+    # function read_changes(timeout) that returns the list of the paths of
+    # the changed files, from get_watched_path(), or [] after timeout
+    # seconds. Returns None if inotify is not available.
+    try:
+        import ctypes
+        import ctypes.util
+        import select
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6",
+                use_errno=True)
+        inotify_init1 = libc.inotify_init1
+        inotify_add_watch = libc.inotify_add_watch
+    except (ImportError, OSError, AttributeError):
+        return None
+
+    fd = inotify_init1(os.O_NONBLOCK | getattr(os, "O_CLOEXEC", 0))
+    if fd < 0:
+        return None
+    mask = IN_CLOSE_WRITE | IN_MOVED_TO
+    # The directory of each watch descriptor
+    directory_map = {}
+    for directory in directory_list:
+        wd = inotify_add_watch(fd, os.fsencode(directory), mask)
+        if wd < 0:
+            os.close(fd)
+            return None
+        directory_map[wd] = directory
+
+    def read_changes(timeout=None):
+        readable, _, _ = select.select([fd], [], [], timeout)
+        if not readable:
+            return []
+        buffer = os.read(fd, 65536)
+        name_list = []
+        offset = 0
+        while offset < len(buffer):
+            wd, event_mask, cookie, length = struct.unpack_from("iIII",
+                    buffer, offset)
+            offset += INOTIFY_EVENT_SIZE
+            name = buffer[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if event_mask & IN_Q_OVERFLOW:
+                # Events were lost. Report every file as changed.
+                for directory in directory_list:
+                    name_list.extend(get_watched_path(directory, name)
+                            for name in sorted(os.listdir(directory)))
+            elif name and wd in directory_map:
+                name_list.append(get_watched_path(directory_map[wd],
+                        os.fsdecode(name)))
+        return name_list
+
+    return read_changes
+
+
+def get_polling_reader(directory_list):
+    # Fallback when inotify is not available. Scan the directories every
+    # WATCH_POLL_INTERVAL seconds and compare the mtime and size of each file.
+    # Returns a function with the same use as the one from get_inotify_reader.
+    def scan():
+        snapshot = {}
+        for directory in directory_list:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    try:
+                        st = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    snapshot[get_watched_path(directory, entry.name)] = (
+                            st.st_mtime_ns, st.st_size)
+        return snapshot
+
+    state = {"snapshot": scan()}
+
+    def read_changes(timeout=None):
+        start = time.monotonic()
+        while True:
+            if timeout is None:
+                interval = WATCH_POLL_INTERVAL
+            else:
+                interval = min(WATCH_POLL_INTERVAL,
+                        max(0, start + timeout - time.monotonic()))
+            time.sleep(interval)
+            snapshot = scan()
+            old_snapshot = state["snapshot"]
+            state["snapshot"] = snapshot
+            name_list = [name for name, stat in snapshot.items()
+                    if old_snapshot.get(name) != stat]
+            if name_list:
+                return sorted(name_list)
+            if timeout is not None and time.monotonic() - start >= timeout:
+                return []
+
+    return read_changes
+
+
+def rebuild_watched_files(file_list, options, entries):
+    # Convert the files that changed while watching. An error is reported
+    # and watching continues. With --incremental a file whose contents did
+    # not change, e.g. only saved again, is skipped.
+    settings = get_settings_key(options)
+    for file_name in file_list:
+        if entries is not None and not options["force"]:
+            if is_up_to_date(entries, file_name, settings):
+                continue
+        try:
+            convert_file(file_name, options=options)
+        except Exception as e:
+            print("Error converting {}: {}: {}"
+                    .format(file_name, type(e).__name__, e), file=sys.stderr)
+            continue
+        if entries is not None:
+            record_conversion(entries, file_name, settings)
+    if entries is not None:
+        save_manifest(entries)
+
+
+def watch_files(file_list, options):
+    # Stay running and regenerate the ipynb file for each .txt or .py file
+    # that changes in the current directory. If files were provided then only
+    # those files are watched, in the directories they are in. A burst of
+    # saves is collected until there has been WATCH_DEBOUNCE seconds without
+    # a change, then converted once.
+    watch_set = set(os.path.normpath(file_name) for file_name in file_list)
+    directory_list = sorted(set(os.path.dirname(file_name) or os.curdir
+            for file_name in watch_set)) or [os.curdir]
+    read_changes = get_inotify_reader(directory_list)
+    method = "inotify"
+    if read_changes is None:
+        read_changes = get_polling_reader(directory_list)
+        method = "polling every {} seconds".format(WATCH_POLL_INTERVAL)
+    entries = None
+    if options["incremental"]:
+        entries = load_manifest()
+
+    print("Watching {} for changes ({}). Press Ctrl+C to stop."
+            .format(", ".join(os.path.abspath(directory)
+            for directory in directory_list), method))
+    pending_set = set()
+    try:
+        while True:
+            if pending_set:
+                name_list = read_changes(WATCH_DEBOUNCE)
+            else:
+                name_list = read_changes(None)
+            for name in name_list:
+                if watch_set and name not in watch_set:
+                    continue
+                if has_extension(name, ("txt", "py")) and os.path.isfile(name):
+                    pending_set.add(name)
+            if name_list or not pending_set:
+                continue
+            # Quiet for WATCH_DEBOUNCE seconds. Convert the changed files.
+            rebuild_watched_files(sorted(pending_set), options, entries)
+            pending_set.clear()
+    except KeyboardInterrupt:
+        print("\nStopped watching.")
+
+
+def parse_address(address):
+    # Address for --serve and --connect. "unix:/path" is a Unix domain socket,
+    # "host:port" or a port number alone, on localhost, is HTTP over TCP.
+    # The host must be a loopback address, as the server reads and writes
+    # any file it is sent the path of. Returns ("unix", path) or (host, port).
+    if address.startswith("unix:"):
+        path = address[len("unix:"):]
+        if not path:
+            sys.exit("A Unix socket address needs a path. E.g. unix:/tmp/ipynb.sock")
+        return "unix", path
+    host, colon, port = address.rpartition(":")
+    if not colon:
+        host = "127.0.0.1"
+    try:
+        port = int(port)
+    except ValueError:
+        sys.exit("{} is not a valid address. Use host:port, port or unix:/path."
+                .format(address))
+    host = host or "127.0.0.1"
+    if host.startswith("[") and host.endswith("]"):
+        host = host[1:-1]
+    if not is_loopback_host(host):
+        sys.exit("{} is not a loopback address. The server only listens"
+                " on localhost, 127.0.0.1 or ::1.".format(host))
+    return host, port
+
+
+def is_loopback_host(host):
+    # True for localhost and the loopback addresses, e.g. 127.0.0.1 or ::1
+    # Imported here, as only --serve and --connect need it
+    import ipaddress
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def get_host_name(host_header):
+    # The host of a Host header, without the port. E.g. "[::1]:80" is "::1"
+    if host_header.startswith("["):
+        return host_header[1:].partition("]")[0]
+    return host_header.partition(":")[0]
+
+
+def is_socket_file(path):
+    # True if path is a Unix socket, not following a symbolic link
+    try:
+        return stat.S_ISSOCK(os.lstat(path).st_mode)
+    except FileNotFoundError:
+        return False
+
+
+def convert_text_job(job):
+    # Runs in a worker process of --serve. job is (source_type, text, name,
+    # split_py). Return the ipynb text of the converted text.
+    source_type, text, name, split_py = job
+    if source_type == "py":
+        data = convert_py(text, name, split_py)
+    else:
+        data = convert_text(text)
+    return dumps_notebook(data)
+
+
+def get_request_options(request_options):
+    # The options of a POST /files request, checked against SERVE_OPTIONS,
+    # the type of their defaults and OPTION_CHOICES. Raises ValueError.
+    if not isinstance(request_options, dict):
+        raise ValueError("options must be an object")
+    options = {}
+    for key, value in request_options.items():
+        if key not in SERVE_OPTIONS:
+            raise ValueError("option {} is not accepted".format(key))
+        default = OPTION_DEFAULTS[key]
+        if (type(value) is not type(default)
+                or isinstance(value, int) and value < 0
+                or key in OPTION_CHOICES and value != default
+                and value not in OPTION_CHOICES[key]):
+            raise ValueError("option {} has an invalid value".format(key))
+        options[key] = value
+    return options
+
+
+def make_server(address, executor, jobs, token=None):
+    # Create the HTTP server of --serve. Each connection is handled by a
+    # thread, which uses keep-alive so a client may send several requests,
+    # pipelined or not, over one connection. The conversions are done by the
+    # worker processes of executor. At most SERVE_QUEUE_PER_JOB requests per
+    # worker are accepted at once, others wait up to SERVE_QUEUE_TIMEOUT
+    # seconds and are then answered with 503. A request from a web page,
+    # which has an Origin header or a Host that is not localhost, is refused.
+    # With a token every request but GET /health must send it in the
+    # SERVE_TOKEN_HEADER header.
+    # Imported here, as only --serve needs them
+    import hmac
+    import http.server
+    import socketserver
+    import threading
+    import urllib.parse
+
+    stats = {
+        "version": VERSION,
+        "jobs": jobs,
+        "started": time.time(),
+        "requests": 0,
+        "errors": 0,
+        "busy": 0,
+        "files": 0,
+        "bytes_in": 0,
+        "bytes_out": 0,
+        "in_flight": 0,
+    }
+    stats_lock = threading.Lock()
+    slots = threading.BoundedSemaphore(jobs * SERVE_QUEUE_PER_JOB)
+
+    def count(**increments):
+        with stats_lock:
+            for key, value in increments.items():
+                stats[key] += value
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        server_version = "ipynb-creator/{}".format(VERSION)
+
+        def address_string(self):
+            # A Unix socket client has no host and port
+            if isinstance(self.client_address, tuple):
+                return self.client_address[0]
+            return "unix"
+
+        def send_body(self, status, body, content_type="application/json"):
+            if isinstance(body, str):
+                body = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            count(bytes_out=len(body), errors=int(status >= 400))
+
+        def send_json(self, status, value):
+            self.send_body(status, json.dumps(value) + "\n")
+
+        def read_body(self):
+            # Returns the request body, or None once an error has been sent
+            try:
+                length = int(self.headers.get("Content-Length", ""))
+            except ValueError:
+                self.send_json(411, {"error": "Content-Length is required."})
+                return None
+            if length > SERVE_MAX_BODY:
+                self.send_json(413, {"error": "Request body is too large."})
+                self.close_connection = True
+                return None
+            body = self.rfile.read(length)
+            count(bytes_in=len(body))
+            return body
+
+        def is_allowed(self, path):
+            # Returns False once the request has been refused
+            host = self.headers.get("Host")
+            if self.headers.get("Origin") is not None or (host is not None
+                    and not is_loopback_host(get_host_name(host))):
+                self.send_json(403, {"error": "Requests from web pages are "
+                        "not accepted."})
+                return False
+            if token and path != "/health" and not hmac.compare_digest(
+                    self.headers.get(SERVE_TOKEN_HEADER, "").encode("utf-8"),
+                    token.encode("utf-8")):
+                self.send_json(403, {"error": "The token of the server is "
+                        "required, see --token."})
+                return False
+            return True
+
+        def do_GET(self):
+            count(requests=1)
+            path = urllib.parse.urlsplit(self.path).path
+            if not self.is_allowed(path):
+                return
+            if path == "/health":
+                self.send_json(200, {"status": "ok", "version": VERSION})
+            elif path == "/stats":
+                with stats_lock:
+                    value = dict(stats)
+                value["uptime"] = round(time.time() - value.pop("started"), 3)
+                self.send_json(200, value)
+            else:
+                self.send_json(404, {"error": "Not found: {}".format(path)})
+
+        def do_POST(self):
+            count(requests=1)
+            url = urllib.parse.urlsplit(self.path)
+            if url.path not in ("/convert", "/files"):
+                self.send_json(404, {"error": "Not found: {}".format(url.path)})
+                return
+            # The body is read first, so the client is not cut off while
+            # it is still sending when the request is refused
+            body = self.read_body()
+            if body is None or not self.is_allowed(url.path):
+                return
+            content_type = self.headers.get("Content-Type", "")
+            if (url.path == "/files" and content_type.partition(";")[0]
+                    .strip().lower() != "application/json"):
+                self.send_json(415, {"error": "Content-Type must be "
+                        "application/json."})
+                return
+            if not slots.acquire(timeout=SERVE_QUEUE_TIMEOUT):
+                count(busy=1)
+                self.send_json(503, {"error": "Server busy."})
+                return
+            count(in_flight=1)
+            try:
+                if url.path == "/convert":
+                    self.post_convert(url.query, body)
+                else:
+                    self.post_files(body)
+            finally:
+                count(in_flight=-1)
+                slots.release()
+
+        def post_convert(self, query, body):
+            # Text in, ipynb out. ?type=txt|py&name=NAME&split_py=markers|defs
+            query = dict(urllib.parse.parse_qsl(query))
+            source_type = query.get("type", "txt")
+            split_py = query.get("split_py", "")
+            if source_type not in ("txt", "py"):
+                self.send_json(400, {"error": "type must be txt or py."})
+                return
+            if split_py and split_py not in OPTION_CHOICES["split_py"]:
+                self.send_json(400, {"error": "split_py must be one of: {}."
+                        .format(", ".join(OPTION_CHOICES["split_py"]))})
+                return
+            try:
+                text = body.decode("utf-8")
+                notebook_text = executor.submit(convert_text_job, (source_type,
+                        text, query.get("name", "program"), split_py)).result()
+            except Exception as e:
+                self.send_json(400, {"error": "{}: {}"
+                        .format(type(e).__name__, e)})
+                return
+            self.send_body(200, notebook_text, "application/x-ipynb+json")
+
+        def post_files(self, body):
+            # Paths in, paths out. The body is {"files": [[file_name,
+            # ipynb_filename], ...], "options": {...}} with absolute paths,
+            # as the server may run in another directory. Answers with the
+            # messages and error of each file, in order.
+            try:
+                request = json.loads(body)
+                options = dict(OPTION_DEFAULTS)
+                options.update(get_request_options(request.get("options", {})))
+                job_list = [(file_name, ipynb_filename, options)
+                        for file_name, ipynb_filename in request["files"]]
+                for _, ipynb_filename, _ in job_list:
+                    if not ipynb_filename.endswith(".ipynb"):
+                        raise ValueError("{} is not an .ipynb file"
+                                .format(ipynb_filename))
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                self.send_json(400, {"error": "Invalid request: {}".format(e)})
+                return
+            chunksize = get_chunksize(len(job_list), jobs)
+            results = [list(result) for result in executor.map(
+                    convert_file_job, job_list, chunksize=chunksize)]
+            count(files=len(results))
+            self.send_json(200, {"results": results})
+
+    if address[0] == "unix":
+        class Server(socketserver.ThreadingUnixStreamServer):
+            daemon_threads = True
+        # A socket file left by a server that was killed. Anything else at
+        # the path is not removed.
+        if is_socket_file(address[1]):
+            os.remove(address[1])
+        elif os.path.lexists(address[1]):
+            sys.exit("{} exists and is not a socket.".format(address[1]))
+        server = Server(address[1], Handler)
+        # Only the user may connect
+        os.chmod(address[1], stat.S_IRUSR | stat.S_IWUSR)
+        return server
+    return http.server.ThreadingHTTPServer(address, Handler)
+
+
+def serve(options):
+    # Run as a server until Ctrl+C. The worker processes are started once and
+    # keep this module loaded, so a request does not pay for the start of
+    # python and the import of this file as each run of the command does.
+    # On TCP a token is required, --token or a random one that is printed.
+    # A Unix socket is only open to the user, and needs a token only if
+    # --token is given.
+    import concurrent.futures
+    import secrets
+    address = parse_address(options["serve"])
+    jobs = options["jobs"] or os.cpu_count() or 1
+    token = options["token"]
+    if not token and address[0] != "unix":
+        token = secrets.token_urlsafe(16)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        # Start the workers now rather than on the first request
+        list(executor.map(abs, range(jobs)))
+        server = make_server(address, executor, jobs, token)
+        if address[0] == "unix":
+            where = "unix:{}".format(address[1])
+        else:
+            where = "http://{}:{}".format(*server.server_address[:2])
+        print("Serving on {} with {} jobs. Press Ctrl+C to stop."
+                .format(where, jobs))
+        if token:
+            print("Token: {} (use --token {} with --connect, or the {} "
+                    "header)".format(token, token, SERVE_TOKEN_HEADER))
+        sys.stdout.flush()
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("\nStopped serving.")
+        finally:
+            server.server_close()
+            if address[0] == "unix" and is_socket_file(address[1]):
+                os.remove(address[1])
+
+
+def get_connection(address):
+    # An http.client connection to the server of --serve at address
+    import http.client
+    import socket
+    address = parse_address(address)
+    if address[0] != "unix":
+        return http.client.HTTPConnection(*address)
+
+    class UnixConnection(http.client.HTTPConnection):
+        def connect(self):
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(address[1])
+
+    return UnixConnection("localhost")
+
+
+def request_server(connection, method, path, body=None, token=""):
+    # Send one request and return the status and the decoded json answer
+    headers = {}
+    if token:
+        headers[SERVE_TOKEN_HEADER] = token
+    if body is not None:
+        body = json.dumps(body).encode("utf-8")
+        headers["Content-Type"] = "application/json"
+    connection.request(method, path, body, headers)
+    response = connection.getresponse()
+    return response.status, json.loads(response.read())
+
+
+def main_with_files_remote(file_list, output_map=None, options=None):
+    # --connect. Have the server of --serve convert the files. The files and
+    # the ipynb files are sent as absolute paths. Messages are printed in
+    # file list order, as with --jobs. Returns the list of the files that
+    # failed and the list of the --stats of the others.
+    connection = get_connection(options["connect"])
+    request_options = dict((key, options[key]) for key in SERVE_OPTIONS)
+    job_list = [[os.path.abspath(file_name),
+            os.path.abspath(get_output_filename(file_name, output_map))]
+            for file_name in file_list]
+    try:
+        status, answer = request_server(connection, "POST", "/files",
+                {"files": job_list, "options": request_options},
+                options["token"])
+    except (OSError, ValueError) as e:
+        sys.exit("Unable to use the server at {}: {}"
+                .format(options["connect"], e))
+    finally:
+        connection.close()
+    if status != 200:
+        sys.exit("Server at {} answered {}: {}"
+                .format(options["connect"], status, answer.get("error")))
+
+    failed_list, stats_list = report_job_results(
+            [file_name] + result[1:]
+            for file_name, result in zip(file_list, answer["results"]))
+
+    print("\nConverted {} of {} files using the server at {}. {} failed."
+            .format(len(file_list) - len(failed_list), len(file_list),
+            options["connect"], len(failed_list)))
+    return failed_list, stats_list
+
+
+def display_help():
+    # Print either the brief or the full help and exit
+    if sys.argv[1] == "-h":
+        print(HELP_BRIEF)
+    else:
+        print(HELP_FULL)
+    sys.exit()
+
+
+def start_interactive(options=None):
+    # No arguments werew passed with the commmand line so use menu driven.
+    # Converting python programs or text file specifically for notebook
+    # The files chosen are converted as if given on the command line.
+    prompt = "\nMove the contents of a python file to Jupyter notebook?"
+    default = True
+    response = query_user_bool(prompt, default,)
+    if response:
+        main_py_files(options)
+    else:
+        main_txt_files(options)
+
+def parse_options(arg_list):
+    # Separate the --option arguments from the file arguments. Returns a
+    # dictionary of options, starting from OPTION_DEFAULTS, and the file list.
+    # An option with a value may be given as "--jobs 4" or as "--jobs=4".
+    options = dict(OPTION_DEFAULTS)
+    file_list = []
+    arg_iter = iter(arg_list)
+    for arg in arg_iter:
+        if not arg.startswith("--"):
+            file_list.append(arg)
+            continue
+
+        name, equals, value = arg[2:].partition("=")
+        key = name.replace("-", "_")
+        if (key.startswith("no_") and not equals
+                and isinstance(options.get(key[3:]), bool)):
+            options[key[3:]] = False
+            continue
+        if key not in options:
+            sys.exit("Unknown option {}. Use --help to list the options."
+                    .format(arg))
+
+        if isinstance(options[key], list):
+            # May be given more than once. Each value is added to the list.
+            if not equals:
+                value = next(arg_iter, None)
+                if value is None:
+                    sys.exit("Option --{} requires a value.".format(name))
+            options[key] = options[key] + [value]
+            continue
+
+        if isinstance(options[key], bool):
+            if equals:
+                sys.exit("Option --{} does not take a value.".format(name))
+            options[key] = True
+            continue
+
+        if not equals:
+            value = next(arg_iter, None)
+            if value is None:
+                sys.exit("Option --{} requires a value.".format(name))
+        if key in OPTION_CHOICES and value not in OPTION_CHOICES[key]:
+            sys.exit("Option --{} must be one of: {}."
+                    .format(name, ", ".join(OPTION_CHOICES[key])))
+        if isinstance(options[key], int):
+            try:
+                value = int(value)
+            except ValueError:
+                sys.exit("Option --{} requires a number. {} is not valid."
+                        .format(name, value))
+            if value < 0:
+                sys.exit("Option --{} can not be negative.".format(name))
+        options[key] = value
+
+    return options, file_list
+
+
+def check_files_exist(file_list):
+    # Test for existance of files in this directory. The directory is read
+    # once into a set. A file name that includes a directory is tested with
+    # os.path.isfile().
+    cur_dir = os.getcwd()
+    with os.scandir(cur_dir) as it:
+        folder_set = set(entry.name for entry in it)
+    for file_name in file_list:
+        if file_name in folder_set:
+            #print("{} exists in: {} ".format(file_name, cur_dir))
+            continue
+        elif os.path.dirname(file_name) and os.path.isfile(file_name):
+            continue
+        else:
+            sys.exit("{} not in directory {}.".format(file_name, cur_dir))
+
+
+def main():
+    # With "-" the notebook is written to stdout, so messages go to stderr
+    if STDIO_NAME in sys.argv[1:]:
+        print("\nipynb-extractor version: {}".format(VERSION),
+                file=sys.stderr)
+    else:
+        print("\nipynb-extractor version: {}".format(VERSION))
+
+    # Check for args
+    if len(sys.argv) > 1:
+        if sys.argv[1].startswith("-h") or sys.argv[1].startswith("--h"):
+            display_help()
+            sys.exit()
+
+    options, file_list = parse_options(sys.argv[1:])
+    if options["split_at_headings"] and not (options["max_cells"]
+            or options["max_bytes"]):
+        sys.exit("--split-at-headings requires --max-cells or --max-bytes.")
+    check_json_options(options)
+    if options["in_flight"] > 1 and options["jobs"] != 1:
+        sys.exit("--in-flight and --jobs can not be used together.")
+    if options["in_flight"] == 0:
+        sys.exit("--in-flight must be at least 1.")
+    if options["validate_reference"]:
+        options["validate"] = True
+        try:
+            import nbformat
+        except ImportError:
+            sys.exit("--validate-reference needs the nbformat package.")
+    if options["execute"] and (options["connect"] or options["serve"]):
+        sys.exit("--execute can not be used with --connect or --serve.")
+    if options["update"] and (options["max_cells"] or options["max_bytes"]
+            or options["output_archive"]):
+        sys.exit("--update can not be used with --max-cells, --max-bytes or "
+                "--output-archive.")
+    if options["watch"] and options["recursive"]:
+        sys.exit("--watch can not be used with --recursive.")
+    if options["output_archive"] and not get_archive_type(
+            options["output_archive"]):
+        sys.exit("--output-archive must be a .zip, .tar, .tar.gz, .tar.bz2 "
+                "or .tar.xz file.")
+
+    if options["profile"]:
+        profile_command(options, file_list)
+    else:
+        run_command(options, file_list)
+
+
+def profile_command(options, file_list):
+    # --profile FILE. Run the command under cProfile and save the pstats to
+    # FILE, also when the command exits with an error. With --jobs only this
+    # process is profiled, not the worker processes.
+    import cProfile
+    profile = cProfile.Profile()
+    try:
+        profile.runcall(run_command, options, file_list)
+    finally:
+        profile.dump_stats(options["profile"])
+        print("Profile written to {}. View it with: python3 -m pstats {}"
+                .format(options["profile"], options["profile"]),
+                file=sys.stderr)
+
+
+def run_command(options, file_list):
+    # Carry out the command given by the options and file arguments
+    if options["clean_cache"]:
+        clean_cache()
+        if len(file_list) == 0:
+            return
+
+    if options["serve"]:
+        serve(options)
+        return
+
+    if options["validate"] and any(has_extension(file_name, ("ipynb",))
+            for file_name in file_list):
+        if not all(has_extension(file_name, ("ipynb",))
+                for file_name in file_list):
+            sys.exit("--validate checks either .ipynb files or the notebooks"
+                    " converted from .txt and .py files, not both at once.")
+        check_files_exist(file_list)
+        main_validate_files(file_list, options)
+        return
+
+    if options["extract"]:
+        if len(file_list) == 0:
+            sys.exit("--extract requires one or more .ipynb files.")
+        check_files_exist(file_list)
+        main_extract_files(file_list, options)
+        return
+
+    if STDIO_NAME in file_list:
+        if len(file_list) != 1:
+            sys.exit("- reads from stdin and can not be used with other files.")
+        convert_stdin(options)
+        return
+
+    if options["recursive"]:
+        # The arguments are directories to walk, the current one by default
+        for root in file_list:
+            if not os.path.exists(root):
+                sys.exit("{} not found.".format(root))
+        file_list, output_map = scan_tree(file_list or [os.curdir], options)
+        print("Found {} .txt and .py files.".format(len(file_list)))
+        if options["output_dir"]:
+            main_with_files(file_list, options, output_map)
+        else:
+            main_with_files(file_list, options)
+        return
+
+    if options["watch"] and len(file_list) == 0:
+        watch_files(file_list, options)
+        return
+
+    if len(file_list) == 0:
+        # go to start interactive
+        start_interactive(options)
+        return
+
+    if len(file_list) == 1:
+        # The argument may be a single file or a list of files comma seperated.
+        # Don't promote comma separation. Promote space based seperation.
+        # Does not accept wildcarded comma seperated. E.g.: *.txt,*.py
+        file_list = file_list[0].split(",")
+
+    # Otherwise a list of space seperated filename arguments.
+    # $ python3 sysarg.py file.py file1.txt
+    # Or may have been space seperated wildcarding. E.g.: *.txt *.py.
+    check_files_exist(file_list)
+    if options["watch"]:
+        watch_files(file_list, options)
+        return
+    # call function and pass file_list as valid list of files in cur_dir
+    main_with_files(file_list, options)
+
+
+# Put the Constants with lots of text at the end. 
+# Makes the main code above easier to read.
+
+# Notebook level metadata. new_notebook() places a copy of this after "cells".
+NOTEBOOK_METADATA = {
+    "kernelspec": {
+        "display_name": "Python 3",
+        "language": "python",
+        "name": "python3"
+    },
+    "language_info": {
+        "codemirror_mode": {
+            "name": "ipython",
+            "version": sys.version_info[0]
+        },
+        "file_extension": ".py",
+        "mimetype": "text/x-python",
+        "name": "python",
+        "nbconvert_exporter": "python",
+        "pygments_lexer": "ipython3",
+        "version": "{}.{}.{}".format(*sys.version_info[:3])
+    }
+}
+
+# --execute. The program of a kernel, run with python -c. Reads json line
+# requests from stdin and writes a json line reply to stdout for each. The
+# channels are moved off fds 0 and 1 first, so input() and child processes
+# of a cell can not read or write them. The value of a final expression is
+# returned as its repr, as the last line of a notebook cell shows it.
+KERNEL_PROGRAM = r"""
+import ast
+import json
+import os
+import sys
+import traceback
+
+requests = os.fdopen(os.dup(0), "r", encoding="utf-8")
+replies = os.fdopen(os.dup(1), "w", encoding="utf-8")
+os.dup2(os.open(os.devnull, os.O_RDONLY), 0)
+os.dup2(2, 1)
+sys.stdin = open(os.devnull, "r")
+
+
+class Stream:
+    # sys.stdout or sys.stderr while a cell runs. Writes are kept in order
+    # with those of the other stream.
+    encoding = "utf-8"
+
+    def __init__(self, name, streams):
+        self.name = name
+        self.streams = streams
+
+    def write(self, text):
+        if self.streams and self.streams[-1][0] == self.name:
+            self.streams[-1][1] += text
+        else:
+            self.streams.append([self.name, text])
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+
+def run(code, namespace):
+    streams = []
+    result = None
+    error = None
+    sys.stdout = Stream("stdout", streams)
+    sys.stderr = Stream("stderr", streams)
+    try:
+        tree = ast.parse(code, "<cell>")
+        last = None
+        if tree.body and isinstance(tree.body[-1], ast.Expr):
+            last = ast.Expression(tree.body.pop().value)
+        exec(compile(tree, "<cell>", "exec"), namespace)
+        if last is not None:
+            value = eval(compile(last, "<cell>", "eval"), namespace)
+            if value is not None:
+                result = repr(value)
+    except BaseException as e:
+        # Leave out the frame of this function
+        error = {"ename": type(e).__name__, "evalue": str(e),
+                "traceback": "".join(traceback.format_exception(type(e), e,
+                e.__traceback__.tb_next))}
+    finally:
+        sys.stdout = sys.__stdout__
+        sys.stderr = sys.__stderr__
+    return {"streams": streams, "result": result, "error": error}
+
+
+namespace = {"__name__": "__main__"}
+for line in requests:
+    request = json.loads(line)
+    if request["op"] == "reset":
+        namespace = {"__name__": "__main__"}
+        os.chdir(request["cwd"])
+        reply = {}
+    else:
+        reply = run(request["code"], namespace)
+    replies.write(json.dumps(reply) + "\n")
+    replies.flush()
+"""
+
+HELP_FULL = """Usage: ipynb-extractor [OPTION]... [FILE]...
+
+Create Jupyter notebook ipynb file(s) upon having been supplied python (.py) or 
+text (.txt) file(s)
+
+[OPTION]...
+Options and arguments:
+   -h       print a brief help message and exits. 
+   --help   print this full help message and exits.
+   --jobs N convert the files using a pool of N processes. 0 uses one
+            process per CPU. A file that fails is reported and the other
+            files are still converted. Default is 1, one file at a time.
+   --in-flight N
+            convert up to N files at once on a pool of threads, overlapping
+            the reading and writing of files. For sources on a network file
+            system, such as NFS or SMB, where each file operation waits on
+            the server. Results are reported in file order and no more than
+            N files are held at once. Default is 1. Not used with --jobs.
+   --incremental
+            only convert the files that changed since the last run. The
+            source file hash, the program version and the options are kept
+            in the build cache .ipynb-creator-cache.json. An ipynb file that
+            was removed or edited is also converted again.
+   --force  convert all the files and refresh the build cache.
+   --clean-cache
+            remove the build cache. Exits if no files are provided.
+   --watch  keep running and regenerate the ipynb file each time a .txt
+            or .py file in the current directory is saved. If files are
+            provided then only those files are watched, in whichever
+            directories they are in. Stop with Ctrl+C. Can not be used
+            with --recursive.
+   --recursive
+            the arguments are directories. Convert every .txt and .py file
+            in them and their sub-directories. The current directory is used
+            if no directory is provided.
+   --output-dir DIR
+            with --recursive, place the ipynb files in DIR, mirroring the
+            directory tree of the source files.
+   --include PATTERN
+            with --recursive, only convert files whose path, relative to the
+            directory provided, matches PATTERN. E.g. --include "lessons/*"
+            May be used more than once.
+   --exclude PATTERN
+            with --recursive, skip the files and directories that match
+            PATTERN. E.g. --exclude "*/drafts" May be used more than once.
+   --split-py markers|defs
+            split a python file into several cells instead of one code
+            cell. "markers" starts a new cell at each "# %%" or "# In[ ]:"
+            comment line, and "# %% [markdown]" starts a markdown cell made
+            from the comment lines that follow. "defs" also puts each top
+            level def or class in a cell of its own. With either, the module
+            docstring and blocks of comments with a blank line before and
+            after become markdown cells.
+   --extract
+            the reverse. Read each .ipynb file provided and write the source
+            of its cells to a .txt file with <markdown>, <code> and <raw>
+            delimiters. The outputs of the cells, which may hold large
+            images, are skipped without being loaded. An existing file is
+            only replaced with --force.
+   --to txt|py
+            with --extract, write a .py file instead. Code cells follow a
+            "# %%" line, markdown cells are comments after "# %% [markdown]".
+   --serve ADDRESS
+            run as a server until Ctrl+C, converting with a pool of --jobs
+            worker processes. ADDRESS is host:port, a port on localhost or
+            unix:/path for a Unix socket. The host must be a loopback
+            address, such as localhost, 127.0.0.1 or ::1. A Unix socket left
+            at the path is replaced, any other file is not. POST
+            /convert?type=txt|py&name=NAME with the text as the body answers
+            with the ipynb text. POST /files converts files to .ipynb files,
+            as --connect does, with the output options but not --execute.
+            Its body must be sent as application/json. GET /health and GET
+            /stats report the state of the server. Requests with an Origin
+            header, or a Host that is not localhost, as a web page sends,
+            are refused. On TCP every request but GET /health must send the
+            token of the server in the X-Ipynb-Creator-Token header. It is
+            printed when the server starts. The Unix socket is only open to
+            the user.
+   --connect ADDRESS
+            have the server at ADDRESS convert the files, saving the start
+            up of python for each run. The other options are the same.
+   --token TOKEN
+            with --serve, the token the server requires rather than a random
+            one. With --connect, the token to send.
+   --parser lines|mmap
+            how .txt files are read. "lines", the default, reads a line at a
+            time. "mmap" maps the file into memory and finds the delimiter
+            lines with one regular expression search, which is faster for
+            large cells. Text that is skipped, before the first delimiter or
+            in a <comment>, is not checked for invalid characters.
+   --max-cells N
+            split a large notebook into parts of at most N cells, named
+            name-001.ipynb, name-002.ipynb and so on. name.ipynb becomes an
+            index notebook with a link to each part. The parts are written as
+            the file is read, at cell boundaries.
+   --max-bytes N
+            split a large notebook into parts of at most N bytes. A cell
+            larger than N is a part of its own.
+   --split-at-headings
+            with --max-cells or --max-bytes, only start a new part at a
+            markdown cell that begins with a # heading. A part may then go
+            over the limit until the next heading.
+   --json-backend auto|stdlib|simplejson|orjson
+            the json encoder used to write the ipynb files. "auto", the
+            default, uses simplejson if it is installed, otherwise the json
+            module of the python standard library. orjson is the fastest.
+            Every backend writes the same text for the same options, but
+            for floats in outputs: orjson writes an exponent without "+" or
+            a leading 0, e.g. 1e100 for 1e+100, the same number. A notebook
+            that holds NaN or infinity, which are not json, is written as
+            the standard library writes it, with any backend.
+   --indent N
+            indent the json by N spaces. Default is 1. orjson only writes 2.
+   --compact
+            write the json without indentation or spaces, for smaller files.
+   --no-ensure-ascii
+            write characters that are not ascii as utf-8 rather than as
+            \\uXXXX escapes. --ensure-ascii, the default, escapes them.
+   --stats  after converting, print the time spent reading, parsing,
+            building the cells, executing them with --execute, serializing
+            the json and writing, the bytes read and written, the cells of
+            each type, the peak memory used and the slowest files.
+   --stats-format text|jsonl
+            with --stats, "jsonl" writes one json line for each file then
+            one line of the totals, whose "file" is null.
+   --stats-file FILE
+            with --stats, write the stats to FILE instead of the screen.
+   --profile FILE
+            run under cProfile and save the profile to FILE, to be viewed
+            with python3 -m pstats FILE. With --jobs the worker processes
+            are not profiled.
+   --output-archive FILE
+            write the ipynb files into one .zip, .tar, .tar.gz, .tar.bz2 or
+            .tar.xz file instead of beside the sources. The archive replaces
+            FILE once all the files are converted. Files provided as
+            arguments may also be .zip or tar archives, whose .txt and .py
+            files are read from the archive and converted one at a time.
+            --parser mmap reads files in archives a line at a time, and
+            <include path> can not be used in them.
+   --type txt|py
+            with the file argument -, whether stdin is delimited text, the
+            default, or a python program.
+   --name NAME
+            with - and --type py, the program name for the heading cell.
+            Default is "program".
+   --update
+            keep the outputs, execution counts and metadata of the cells
+            that are unchanged in an existing ipynb file. The new cells are
+            matched against its cells, by type and a hash of the source,
+            with a sequence diff, so after editing one cell the others need
+            not be run again. The cells are held in memory while matching.
+   --execute
+            run the code cells and save their outputs in the notebook. The
+            cells run on a pool of python kernels that are started once and
+            kept warm for all the files, with a fresh namespace for each
+            notebook, in the directory of the ipynb file. The code is plain
+            python, not IPython, so %magics are not run. At a cell that
+            raises the notebook stops, and the cells after it have no outputs.
+   --kernels N
+            with --execute, the number of kernels, and so of notebooks run at
+            once. Default is one per file converted at once, see --in-flight.
+            With --jobs each worker process has its own kernel.
+   --cell-timeout N
+            with --execute, stop a cell that runs longer than N seconds and
+            restart its kernel. Default is 30. 0 is no limit.
+   --validate
+            check each notebook against the nbformat 4 schema as it is
+            written. A cell that is not valid, e.g. one kept by --update, is
+            reported with its line in the ipynb file and the file is not
+            written. With .ipynb files as the arguments, check those files
+            and report the errors of each cell. Nothing is written. Fast
+            enough for large batches, and --jobs spreads it over processes.
+   --validate-reference
+            with .ipynb files, also check each with the nbformat package, if
+            it is installed, and report where the two disagree.
+
+[FILE]...
+If no files are provided as arguments then the program will run in a menu 
+driven mode and prompt you to select either python (.py) or text (.txt)
+files. The files are listed a page at a time. Type /text to show only the
+files whose names contain text, or its letters in order. Choose one or more
+files by number or range, e.g. 1-20,35, or * for all the files shown. The
+other options apply to the files chosen.
+
+Any file with the .py or .txt extensions in the current working directory may 
+be provided as an argument. The created ipynb file will have the same name as
+the .py or .txt from which it was created.
+
+A list of space separated files may be provided for which one Jupyter ipynb
+file will be created for each file in the list.
+
+A file argument of - reads the text from stdin and writes the notebook to
+stdout, a cell at a time, for use in a pipeline. E.g.
+$ generate-lesson | ipynb-creator - > lesson.ipynb
+$ ipynb-creator - --type py --name hello < hello.py > hello.ipynb
+
+The files may be selected by wildcarding with *, or *.py or *.txt. E.g.
+$ ipynb-extractor *.py
+All .py files in current directory have a Jupyter notebook ipynb file created.
+$ ipynb-extractor *.py *.txt
+All .py and .txt files have a Jupyter notebook ipynb files created. 
+
+Notes:
+For an ipynb file created from a python file its first cell will be markdown
+containing the python script file name. The second cell will be the python 
+script in a code cell.
+
+For an ipynb file created from a text file its cells will have been determined
+by the <code> and <markdown> delimiters that were inserted into the text file.
+
+For the text (.txt) files the delmiter guidelines are:
+o Delimiters start with left angle bracket "<" and end with right angle ">".
+o A delimiters left angle bracket "<" must be the first character on a line.
+o Delimiters that create Jupyter notebook cells are <markdown> and <code>.
+o Delimiter <raw> creates a raw cell, which nbconvert passes through as it
+    is. <raw text/html> also sets the format of the cell.
+o Delimiter <comment> allows one line comments within the text file.
+    E.g. < comment The next code cell is from my hello_world.py program>
+o Other delimiters may include a comment. 
+    E.g. <code This is my /python/hello_world.py program>
+o Delimiter <include path> inserts another file, its path relative to the
+    file being read. The cells of a .txt file are inserted after the cell,
+    the lines of any other file are added to the cell. E.g.
+    <include snippets/setup.py> An included file is read once per run and
+    with --incremental a change to it converts the files that include it.
+o A delimiter may be surrounded by spaces. E.g. <   code         > 
+o Text that follows a delimiter becomes the markdown or the code.
+o Lines of text before the first delimiter are ignored. 
+
+Example text file:
+help_text_example.txt
+
+Anything written here is ignored because its before the first delimiter.
+This file is stored in my github repository and in my /python/dev/ folder.
+I wrote this text in August 2019.
+
+<markdown>
+# Hello World Heading
+This is my *hello world* program.
+<code>
+# hello_world
+print("hello world")
+
+< markdown The second python program will do some maths.>
+# Maths
+This is how to obtain the **square root of 2**
+
+< code >
+import math
+< comment Remember to include the import math!>
+a = 2
+print(math.sqrt(a))
+< markdown >
+### *The End*
+<comment This is the end of the help_text_example.txt file.>
+
+Author: Ian Stewart - 7 August 2019.
+"""
+
+HELP_BRIEF = """Usage: ipynb-extractor [OPTION]... [FILE]...
+Create Jupyter notebook ipynb file(s) upon having been supplied python (.py) or 
+text (.txt) file(s)
+
+[OPTION]...
+Options and arguments:
+   -h       print this brief help message and exit. 
+   --help   print the full help message which includes an example then exit.
+   --jobs N convert the files using a pool of N processes.
+   --incremental  only convert the files that changed since the last run.
+   --force  convert all the files and refresh the build cache.
+   --clean-cache  remove the build cache.
+   --watch  regenerate the ipynb file each time a .txt or .py file is saved.
+   --recursive  convert the files in directories and their sub-directories.
+   --output-dir DIR  with --recursive, mirror the directory tree into DIR.
+   --include PATTERN, --exclude PATTERN  with --recursive, select the files.
+   --split-py markers|defs  split a python file into several cells.
+   --extract  write .txt files from .ipynb files. --to py for .py files.
+   --serve ADDRESS  run as a conversion server. --connect ADDRESS to use it.
+   --token TOKEN  the token of a --serve server on TCP, for --connect.
+   --parser lines|mmap  how .txt files are read.
+   --max-cells N, --max-bytes N  split large notebooks into linked parts.
+   --split-at-headings  with --max-cells or --max-bytes, split at headings.
+   --json-backend auto|stdlib|simplejson|orjson  the json encoder.
+   --indent N, --compact, --no-ensure-ascii  the format of the json.
+   --stats  report the time of each phase. --stats-format jsonl for json.
+   --profile FILE  save a cProfile profile of the run to FILE.
+   --output-archive FILE  write the ipynb files into a zip or tar file.
+   --type txt|py, --name NAME  what the file argument - reads from stdin.
+   --update  keep the outputs of unchanged cells in existing ipynb files.
+   --execute  run the code cells on warm kernels and save their outputs.
+   --kernels N, --cell-timeout N  the kernels and cell time limit of --execute.
+   --validate  check the notebooks written, or the .ipynb files provided.
+   --in-flight N  convert N files at once with threads, for network drives.
+
+[FILE]...
+If no files are provided as argruments then the program will run in a menu 
+driven mode. 
+
+Any file with the .py or .txt extensions in the current working directory may 
+be provided as an argument. A list of space separated files may be provided 
+for which one Jupyter ipynb file will be created for each file in the list.
+
+The files may be selected by wildcarding with *, or *.py or *.txt.
+
+Author: Ian Stewart - 7 August 2019.
+"""
+# Continue by calling the main() function routine. Guarded so that this file
+# can be imported as a library, and by the worker processes of --jobs,
+# without running main().
+if __name__ == "__main__":
+
+    if sys.version_info[0] != 3:
+        sys.exit("Please use python version 3. Exiting...")
+
+    main()
+
@@ -0,0 +1,646 @@
+# test_ipynb_creator.py
+#
+# Tests of the ipynb_creator.py library. Run with:
+# $ python3 -m pytest -q
+#
+# The lines and mmap parsers of .txt files must give the same cells, or the
+# same error, for any text. The samples hold the quirks of the delimiter
+# rules, as the lines parser reads them, and random texts are made from the
+# same pieces.
+#
+import concurrent.futures
+import io
+import json
+import os
+import random
+import threading
+
+import pytest
+
+import ipynb_creator
+
+# Text files which hold the quirks of the delimiter rules
+PARSER_SAMPLES = [
+    ("plain", "<markdown>\n# Heading\n<code>\nprint(1)\n"),
+    ("spaced", "<   code         >\nx = 1\n< markdown >\ntext\n"),
+    ("inline comment", "<code This is my /python/hello_world.py program>\n"
+            "print('hello world')\n<markdown A note.>\nThe end\n"),
+    ("comment lines", "<code>\nimport math\n< comment Remember the import!>"
+            "\na = 2\n<comment>\nprint(math.sqrt(a))\n"),
+    ("before first", "Ignored text.\nMore ignored.\n\n<markdown>\nKept\n"),
+    ("unknown delimiter", "<code>\na = 1\n<note dropped>\nb = 2\n"
+            "<raw>\nraw text\n"),
+    ("no newline at end", "<markdown>\nlast line"),
+    ("delimiter at end", "<markdown>\ntext\n<code>"),
+    ("empty cells", "<code>\n<code>\n<markdown>\n\n"),
+    ("no delimiter", "Only text.\nNo cells.\n"),
+    ("empty", ""),
+    ("empty delimiter", "<markdown>\ntext\n<>\nmore\n"),
+    ("lone bracket", "<code>\nx\n<\n"),
+    ("unclosed", "<code\nx = 1\n<markdown>\n<code >> \ny\n"),
+    ("indented", "<code>\n <markdown>\n\t<code>\nz\n"),
+    ("other line ends", "<markdown>\npage\x0cbreak\x85next\u2028line\n"
+            "<code>\n"),
+    ("unicode", "<markdown>\nCaf\u00e9 \u2603\n<\u00a0code\u00a0>\n"
+            "\u03c0 = 3.14\n"),
+    ("trailing spaces", "<code>   \nx\n< markdown >\t \ny\n"),
+    ("keyword and comment", "<code>\nx\n<comment \u00a0\ny\n<code \u00a0x>\n"
+            "z\n<markdown  a\n<raw\tb>\n<code x\n"),
+    ("raw formats", "<raw text/html>\n<b>\n<raw  text/x-rst  >\n*x*\n"
+            "<raw text/>\n<raw a b>\nc\n"),
+]
+
+# The lines random texts are made from
+RANDOM_LINES = [
+    "<markdown>", "<code>", "<raw>", "<comment>", "< code >", "<code x>",
+    "<markdown\ta>", "<raw text/html>", "<raw text/x-rst >", "<note>", "<>",
+    "<", "<code", " <code>", "<comment \u00a0", "<\u00a0code\u00a0>", "",
+    " ", "x = 1", "# Heading", "print('<code>')", "text < more",
+    "Caf\u00e9 \u2603", "page\x0cbreak", "a\x85b", "c\u2028d", "\t",
+]
+RANDOM_CASES = 300
+
+
+def parse_with_both(text):
+    # The cells, or the type of the error, from each parser
+    results = []
+    for parse in (
+            lambda: ipynb_creator.parse_text_lines(io.StringIO(text)),
+            lambda: ipynb_creator.parse_text_buffer(text.encode("utf-8"),
+                "utf-8")):
+        try:
+            results.append(list(parse()))
+        except Exception as e:
+            results.append(type(e).__name__)
+    return results
+
+
+def make_random_text(seed):
+    # A text of random lines, which may end without a newline
+    rng = random.Random(seed)
+    lines = [rng.choice(RANDOM_LINES) for _ in range(rng.randint(0, 30))]
+    text = "\n".join(lines)
+    if lines and rng.random() < 0.7:
+        text += "\n"
+    return text
+
+
+@pytest.mark.parametrize("name, text", PARSER_SAMPLES,
+        ids=[name for name, _ in PARSER_SAMPLES])
+def test_parsers_agree_on_samples(name, text):
+    lines_result, mapped_result = parse_with_both(text)
+    assert lines_result == mapped_result
+
+
+@pytest.mark.parametrize("seed", range(RANDOM_CASES))
+def test_parsers_agree_on_random_text(seed):
+    text = make_random_text(seed)
+    lines_result, mapped_result = parse_with_both(text)
+    assert lines_result == mapped_result, repr(text)
+
+
+@pytest.mark.parametrize("seed", range(0, RANDOM_CASES, 10))
+def test_parsers_agree_on_files(tmp_path, seed):
+    # Through process_text_file(), which maps the file with --parser mmap
+    text_file = tmp_path / "sample.txt"
+    text_file.write_text(make_random_text(seed), encoding="utf-8")
+    results = []
+    for parser in ("lines", "mmap"):
+        try:
+            results.append(list(ipynb_creator.process_text_file(
+                    str(text_file), parser)))
+        except Exception as e:
+            results.append(type(e).__name__)
+    assert results[0] == results[1]
+
+
+def test_dumps_notebook_partial_options():
+    data = ipynb_creator.convert_text("<code>\nx = 1\n")
+    text = ipynb_creator.dumps_notebook(data, {"compact": True})
+    assert text == json.dumps(data, separators=(",", ":"))
+    assert ipynb_creator.dumps_notebook(data, {"indent": 2}) == json.dumps(
+            data, indent=2)
+
+
+def test_server_round_trip(tmp_path):
+    # --serve on a Unix socket and --connect, with a thread pool in place of
+    # the worker processes
+    socket_path = str(tmp_path / "server.sock")
+    text = "<markdown>\n# Served\n<code>\nprint(1)\n"
+    text_file = tmp_path / "a.txt"
+    text_file.write_text(text)
+    with concurrent.futures.ThreadPoolExecutor(2) as executor:
+        server = ipynb_creator.make_server(("unix", socket_path), executor, 2,
+                "secret")
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            options = dict(ipynb_creator.OPTION_DEFAULTS,
+                    connect="unix:" + socket_path, token="secret")
+            failed_list, _ = ipynb_creator.main_with_files_remote(
+                    [str(text_file)], None, options)
+            assert failed_list == []
+            assert (tmp_path / "a.ipynb").read_text() == (
+                    ipynb_creator.dumps_notebook(
+                    ipynb_creator.convert_text(text)))
+
+            body = {"files": [[str(text_file), str(tmp_path / "b.ipynb")]]}
+            for headers, token, status in [
+                    ({}, "", 403),
+                    ({"Origin": "http://example.com"}, "secret", 403),
+                    ({"Host": "example.com"}, "secret", 403)]:
+                connection = ipynb_creator.get_connection(
+                        "unix:" + socket_path)
+                headers = dict(headers, **{"Content-Type": "application/json",
+                        ipynb_creator.SERVE_TOKEN_HEADER: token})
+                connection.request("POST", "/files",
+                        json.dumps(body).encode("utf-8"), headers)
+                assert connection.getresponse().status == status
+                connection.close()
+            connection = ipynb_creator.get_connection("unix:" + socket_path)
+            connection.request("POST", "/files", json.dumps(body), {
+                    "Content-Type": "text/plain",
+                    ipynb_creator.SERVE_TOKEN_HEADER: "secret"})
+            assert connection.getresponse().status == 415
+            connection.close()
+            assert not (tmp_path / "b.ipynb").exists()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+def test_include_cells_and_lines(tmp_path):
+    # A .txt file adds its cells, any other file adds its lines to the cell.
+    # Paths are relative to the file that includes them.
+    (tmp_path / "parts").mkdir()
+    (tmp_path / "parts" / "setup.py").write_text("import os\n")
+    (tmp_path / "parts" / "intro.txt").write_text(
+            "<markdown>\n# Intro\n<code>\n<include setup.py>\n")
+    main_file = tmp_path / "main.txt"
+    main_file.write_text("<code>\nx = 1\n<include parts/intro.txt>\n"
+            "y = 2\n<code>\n<include parts/setup.py>\nprint(os)\n")
+    cells = list(ipynb_creator.process_text_file(str(main_file)))
+    assert cells == [("code", ["x = 1\n"]), ("markdown", ["# Intro\n"]),
+            ("code", ["import os\n"]), ("code", ["y = 2\n"]),
+            ("code", ["import os\n", "print(os)\n"])]
+
+
+def test_include_errors_are_reported_per_file(tmp_path, monkeypatch,
+        capsys):
+    # A missing file and a loop fail their file only. The other files are
+    # still converted and the exit status is 1.
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "missing.txt").write_text("<code>\n<include nothere.py>\n")
+    (tmp_path / "loop_a.txt").write_text("<code>\n<include loop_b.txt>\n")
+    (tmp_path / "loop_b.txt").write_text("<code>\n<include loop_a.txt>\n")
+    (tmp_path / "good.txt").write_text("<code>\nprint(1)\n")
+    with pytest.raises(SystemExit) as exc_info:
+        ipynb_creator.main_with_files(["missing.txt", "loop_a.txt",
+                "good.txt"])
+    assert exc_info.value.code == 1
+    err = capsys.readouterr().err
+    assert "Error converting missing.txt: FileNotFoundError" in err
+    assert "Error converting loop_a.txt: ValueError: Include loop" in err
+    assert (tmp_path / "good.ipynb").exists()
+    assert not (tmp_path / "missing.ipynb").exists()
+
+
+PY_SOURCE = '''"""Module docstring."""
+import os
+
+
+# A block of comments
+# on two lines
+
+def a():
+    pass
+
+
+@decorator
+class B:
+    pass
+# %%
+x = 1
+# %% [markdown]
+# Some *markdown*
+'''
+
+
+def test_parse_py_lines_markers():
+    cells = list(ipynb_creator.parse_py_lines(io.StringIO(PY_SOURCE),
+            "markers"))
+    assert cells == [
+            ("markdown", ["Module docstring."]),
+            ("code", ["import os"]),
+            ("markdown", ["A block of comments\n", "on two lines"]),
+            ("code", ["def a():\n", "    pass\n", "\n", "\n",
+                    "@decorator\n", "class B:\n", "    pass"]),
+            ("code", ["x = 1"]),
+            ("markdown", ["Some *markdown*"])]
+
+
+def test_parse_py_lines_defs():
+    cells = list(ipynb_creator.parse_py_lines(io.StringIO(PY_SOURCE),
+            "defs"))
+    assert ("code", ["def a():\n", "    pass"]) in cells
+    assert ("code", ["@decorator\n", "class B:\n", "    pass"]) in cells
+
+
+def test_parse_py_lines_keeps_source():
+    # Every line of code is in a cell, in order
+    source = "x = [1,\n# %% not a marker inside brackets\n2]\ny = '''\n\n'''\n"
+    cells = list(ipynb_creator.parse_py_lines(io.StringIO(source), "defs"))
+    code = "\n".join("".join(lines) for cell_type, lines in cells
+            if cell_type == "code")
+    assert "x = [1,\n# %% not a marker inside brackets\n2]" in code
+    assert "y = '''\n\n'''" in code
+
+
+def test_json_stream_values():
+    text = ('{"a": [1, 2.5, true, null, -3e2], "b": "x\\u00e9\\"\\n", '
+            '"c": {"d": [[], {}]}, "e": "\\ud83d\\ude00"}')
+    # A small chunk size splits the tokens over several reads
+    for chunk_size in (1, 3, 1024):
+        stream = ipynb_creator.JsonStream(io.StringIO(text), chunk_size)
+        data = dict((key, stream.value()) for key in stream.object_keys())
+        assert data == json.loads(text)
+
+
+def test_json_stream_skip_value():
+    text = '{"skip": {"s": "a]}\\"", "l": [1, [2, "}"]]}, "keep": [true]}'
+    stream = ipynb_creator.JsonStream(io.StringIO(text), 2)
+    kept = {}
+    for key in stream.object_keys():
+        if key == "keep":
+            kept[key] = stream.value()
+        else:
+            stream.skip_value()
+    assert kept == {"keep": [True]}
+
+
+def test_json_stream_error():
+    stream = ipynb_creator.JsonStream(io.StringIO('{"a" 1}'))
+    with pytest.raises(ValueError):
+        list(stream.object_keys())
+
+
+def test_iter_ipynb_cells():
+    data = ipynb_creator.convert_text("<markdown>\n# Title\n<code>\nx = 1\n"
+            "<raw text/html>\nplain\n")
+    data["cells"][1]["outputs"] = [{"output_type": "stream",
+            "name": "stdout", "text": ["x" * 10000]}]
+    f = io.StringIO(ipynb_creator.dumps_notebook(data))
+    assert list(ipynb_creator.iter_ipynb_cells(f)) == [
+            ("markdown", "# Title\n", {}), ("code", "x = 1\n", {}),
+            ("raw", "plain\n", {"format": "text/html"})]
+
+
+def test_raw_cell_format():
+    cells = list(ipynb_creator.parse_text_lines(io.StringIO(
+            "Ignored\n<markdown>\n# Heading\n<comment>\n<code x>\nprint(1)\n"
+            "<raw text/html>\n<b>bold</b>\n")))
+    assert cells == [("markdown", ["# Heading\n"]),
+            ("code", ["print(1)\n"]), ("raw text/html", [])]
+
+
+def test_validate_generated_notebook(tmp_path):
+    data = ipynb_creator.convert_text("<markdown>\n# A\n<code>\nx = 1\n"
+            "<raw text/html>\n<b>\n")
+    ipynb_file = tmp_path / "a.ipynb"
+    ipynb_file.write_text(ipynb_creator.dumps_notebook(data),
+            encoding="utf-8")
+    assert ipynb_creator.validate_ipynb_file(str(ipynb_file)) == []
+
+
+def test_validate_errors_have_line_numbers(tmp_path):
+    data = ipynb_creator.convert_text("<markdown>\n# A\n<code>\nx = 1\n")
+    del data["cells"][1]["outputs"]
+    data["cells"][0]["metadata"]["tags"] = "not a list"
+    ipynb_file = tmp_path / "a.ipynb"
+    text = ipynb_creator.dumps_notebook(data)
+    ipynb_file.write_text(text, encoding="utf-8")
+    _, cell_lines = ipynb_creator.decode_notebook(text)
+    errors = ipynb_creator.validate_ipynb_file(str(ipynb_file))
+    assert errors == [
+            "cell 1 (line {}): metadata 'tags' has the wrong type"
+                .format(cell_lines[0]),
+            "cell 2 (line {}): 'outputs' is required".format(cell_lines[1])]
+
+
+def test_validate_not_json(tmp_path):
+    ipynb_file = tmp_path / "a.ipynb"
+    ipynb_file.write_text('{"cells": [', encoding="utf-8")
+    errors = ipynb_creator.validate_ipynb_file(str(ipynb_file))
+    assert len(errors) == 1 and errors[0].startswith("not valid json")
+
+
+def test_validate_cell_and_header():
+    cell_dict = {"cell_type": "code", "source": "x", "metadata": {},
+            "outputs": []}
+    assert ipynb_creator.validate_cell(cell_dict, 5) == [
+            "'execution_count' is required", "'id' is required"]
+    assert ipynb_creator.validate_cell(dict(cell_dict, execution_count=None,
+            id="a1"), 5) == []
+    assert ipynb_creator.validate_notebook_header({"cells": [],
+            "metadata": {}, "nbformat": 3, "nbformat_minor": 2}) == [
+            "'nbformat' must be 4"]
+
+
+def test_decode_notebook_cell_lines():
+    data = ipynb_creator.convert_text("<code>\nprint(1)\n<markdown>\nx\n")
+    text = ipynb_creator.dumps_notebook(data)
+    decoded, cell_lines = ipynb_creator.decode_notebook(text)
+    assert decoded == json.loads(text)
+    lines = text.split("\n")
+    assert [lines[line - 1].strip() for line in cell_lines] == ["{", "{"]
+    assert len(cell_lines) == 2
+
+
+def test_validate_failure_is_reported_per_file(tmp_path, monkeypatch,
+        capsys):
+    # --update keeps metadata that is not valid. The notebook is not
+    # written, its error is reported with the cell and line, and the other
+    # files are still converted.
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "a.txt").write_text("<code>\nprint(1)\n")
+    (tmp_path / "b.txt").write_text("<code>\nprint(2)\n")
+    ipynb_creator.main_with_files(["a.txt", "b.txt"])
+    data = json.loads((tmp_path / "a.ipynb").read_text())
+    data["cells"][0]["metadata"]["collapsed"] = "yes"
+    old_text = json.dumps(data)
+    (tmp_path / "a.ipynb").write_text(old_text)
+    capsys.readouterr()
+    options = dict(ipynb_creator.OPTION_DEFAULTS, update=True, validate=True)
+    with pytest.raises(SystemExit) as exc_info:
+        ipynb_creator.main_with_files(["a.txt", "b.txt"], options)
+    assert exc_info.value.code == 1
+    captured = capsys.readouterr()
+    assert ("Error converting a.txt: ValueError: a.ipynb would not be a "
+            "valid notebook: cell 1 (line 3): metadata 'collapsed' has the "
+            "wrong type") in captured.err
+    assert "ipynb file created: a.ipynb" not in captured.out
+    assert "ipynb file created: b.ipynb" in captured.out
+    assert (tmp_path / "a.ipynb").read_text() == old_text
+
+
+JSON_BACKEND_SAMPLE = {
+    "text": ["Café ☃    \x7f", "\U0001f600 \U00010000",
+            "".join(chr(code) for code in range(32)) + '"\\/'],
+    "numbers": [0, -1, 2 ** 53, 0.5, 3.14159, -2.5e-3, 1.0, 123456.789],
+    "values": [True, False, None, {}, []],
+}
+
+
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+@pytest.mark.parametrize("compact", [False, True])
+def test_json_backends_write_the_same_text(compact, ensure_ascii):
+    pytest.importorskip("orjson")
+    texts = []
+    for backend in ("stdlib", "orjson"):
+        dumps = ipynb_creator.get_json_dumps(dict(
+                ipynb_creator.OPTION_DEFAULTS, json_backend=backend, indent=2,
+                compact=compact, ensure_ascii=ensure_ascii))
+        texts.append(dumps(JSON_BACKEND_SAMPLE))
+    assert texts[0] == texts[1]
+
+
+def test_json_backends_floats():
+    # orjson writes some exponents differently, as the same number. NaN and
+    # infinity are written as the standard library writes them.
+    pytest.importorskip("orjson")
+    dumps_list = [ipynb_creator.get_json_dumps(dict(
+            ipynb_creator.OPTION_DEFAULTS, json_backend=backend, indent=2))
+            for backend in ("stdlib", "orjson")]
+    value = {"data": [1e100, 1e-7, 5e-324, 1.7976931348623157e308]}
+    texts = [dumps(value) for dumps in dumps_list]
+    assert json.loads(texts[0]) == json.loads(texts[1]) == value
+    for value in ({"outputs": [{"data": {"x": [1.0, float("nan")]}}]},
+            [float("inf")], -float("inf")):
+        assert dumps_list[0](value) == dumps_list[1](value)
+
+
+def make_lesson(cell_total):
+    # A text file of cell_total cells, a heading and a code cell per pair
+    return "".join("<markdown>\n# Part {}\n<code>\nprint({})\n".format(i, i)
+            for i in range(cell_total // 2))
+
+
+def test_max_cells_parts_and_index(tmp_path):
+    text_file = tmp_path / "my (lesson) [1].txt"
+    text_file.write_text(make_lesson(20))
+    index_file = tmp_path / "my (lesson) [1].ipynb"
+    options = dict(ipynb_creator.OPTION_DEFAULTS, max_cells=4)
+    ipynb_creator.convert_file(str(text_file), lambda message: None,
+            options=options)
+    parts = [tmp_path / "my (lesson) [1]-{:03}.ipynb".format(number)
+            for number in range(1, 6)]
+    cells = []
+    for part in parts:
+        part_cells = json.loads(part.read_text())["cells"]
+        assert len(part_cells) <= 4
+        cells.extend(part_cells)
+    assert cells == ipynb_creator.convert_text(make_lesson(20))["cells"]
+    index = json.loads(index_file.read_text())
+    assert index["metadata"]["ipynb_creator"] == {"parts": 5}
+    source = "".join(index["cells"][0]["source"])
+    assert ("1. [my (lesson) \\[1\\]-001.ipynb]"
+            "(my%20%28lesson%29%20%5B1%5D-001.ipynb)") in source
+
+
+def test_stale_parts_removed_only_if_written(tmp_path):
+    # A later conversion with fewer parts removes the parts the index
+    # records, but not a notebook of another source with a part-like name
+    text_file = tmp_path / "lesson.txt"
+    text_file.write_text(make_lesson(20))
+    options = dict(ipynb_creator.OPTION_DEFAULTS, max_cells=4)
+    ipynb_creator.convert_file(str(text_file), lambda message: None,
+            options=options)
+    other = tmp_path / "lesson-007.ipynb"
+    other.write_text("other")
+    options["max_cells"] = 8
+    ipynb_creator.convert_file(str(text_file), lambda message: None,
+            options=options)
+    assert sorted(path.name for path in tmp_path.glob("lesson-*.ipynb")) == [
+            "lesson-001.ipynb", "lesson-002.ipynb", "lesson-003.ipynb",
+            "lesson-007.ipynb"]
+    ipynb_creator.convert_file(str(text_file), lambda message: None,
+            options=dict(options, max_cells=100))
+    assert sorted(path.name for path in tmp_path.glob("lesson-*.ipynb")) == [
+            "lesson-007.ipynb"]
+    assert len(json.loads((tmp_path / "lesson.ipynb").read_text())[
+            "cells"]) == 20
+
+
+def test_max_bytes_parts(tmp_path):
+    text_file = tmp_path / "big.txt"
+    text_file.write_text(make_lesson(200))
+    options = dict(ipynb_creator.OPTION_DEFAULTS, max_bytes=4000)
+    ipynb_creator.convert_file(str(text_file), lambda message: None,
+            options=options)
+    parts = sorted(tmp_path.glob("big-*.ipynb"))
+    assert len(parts) > 1
+    for part in parts:
+        assert part.stat().st_size <= 4000
+    assert sum(len(json.loads(part.read_text())["cells"])
+            for part in parts) == 200
+
+
+def test_incremental_skips_unchanged_files(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "a.txt").write_text("<code>\nprint(1)\n")
+    (tmp_path / "b.txt").write_text("<code>\nprint(2)\n")
+    options = {"incremental": True}
+    ipynb_creator.main_with_files(["a.txt", "b.txt"], options)
+    assert "0 of 2 files are up to date." in capsys.readouterr().out
+    ipynb_creator.main_with_files(["a.txt", "b.txt"], options)
+    out = capsys.readouterr().out
+    assert "2 of 2 files are up to date." in out
+    assert "ipynb file created" not in out
+    # Touching a file without editing it does not rebuild it
+    os.utime("a.txt", ns=(0, 0))
+    ipynb_creator.main_with_files(["a.txt", "b.txt"], options)
+    assert "2 of 2 files are up to date." in capsys.readouterr().out
+    (tmp_path / "b.txt").write_text("<code>\nprint(22)\n")
+    ipynb_creator.main_with_files(["a.txt", "b.txt"], options)
+    out = capsys.readouterr().out
+    assert "1 of 2 files are up to date." in out
+    assert "ipynb file created: b.ipynb" in out
+    assert "print(22)" in (tmp_path / "b.ipynb").read_text()
+
+
+def test_incremental_rebuilds_on_settings_output_and_force(tmp_path,
+        monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "a.txt").write_text("<code>\nprint(1)\n")
+    ipynb_creator.main_with_files(["a.txt"], {"incremental": True})
+    capsys.readouterr()
+    # An output setting changed
+    ipynb_creator.main_with_files(["a.txt"], {"incremental": True,
+            "indent": 2})
+    assert "0 of 1 files are up to date." in capsys.readouterr().out
+    # The ipynb file was removed
+    os.remove("a.ipynb")
+    ipynb_creator.main_with_files(["a.txt"], {"incremental": True,
+            "indent": 2})
+    assert "0 of 1 files are up to date." in capsys.readouterr().out
+    assert (tmp_path / "a.ipynb").exists()
+    ipynb_creator.main_with_files(["a.txt"], {"force": True, "indent": 2})
+    assert "ipynb file created: a.ipynb" in capsys.readouterr().out
+    ipynb_creator.main_with_files(["a.txt"], {"incremental": True,
+            "indent": 2})
+    assert "1 of 1 files are up to date." in capsys.readouterr().out
+
+
+def test_incremental_rebuilds_when_an_include_changes(tmp_path, monkeypatch,
+        capsys):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "part.py").write_text("x = 1\n")
+    (tmp_path / "a.txt").write_text("<code>\n<include part.py>\n")
+    ipynb_creator.main_with_files(["a.txt"], {"incremental": True})
+    capsys.readouterr()
+    (tmp_path / "part.py").write_text("x = 22\n")
+    ipynb_creator.main_with_files(["a.txt"], {"incremental": True})
+    assert "0 of 1 files are up to date." in capsys.readouterr().out
+    assert "x = 22" in (tmp_path / "a.ipynb").read_text()
+
+
+ARCHIVE_SOURCES = {
+    "a.txt": "<markdown>\n# Title\n<code>\nprint('é')\n",
+    "sub/b.py": "# %%\nimport os\n\n# %% [markdown]\n# Notes\n",
+}
+
+
+@pytest.mark.parametrize("archive_name", ["in.zip", "in.tar.gz"])
+def test_archive_round_trip(tmp_path, monkeypatch, capsys, archive_name):
+    # The notebooks of the files in an archive, written into another
+    # archive, are the same as those of the files converted on disk
+    import tarfile
+    import zipfile
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "sub").mkdir()
+    for name, text in ARCHIVE_SOURCES.items():
+        (tmp_path / name).write_text(text, encoding="utf-8")
+    ipynb_creator.main_with_files(list(ARCHIVE_SOURCES))
+    expected = {name: (tmp_path / name).read_bytes()
+            for name in ("a.ipynb", "sub/b.ipynb")}
+    if archive_name.endswith(".zip"):
+        with zipfile.ZipFile(archive_name, "w") as zip_file:
+            for name in ARCHIVE_SOURCES:
+                zip_file.write(name)
+    else:
+        with tarfile.open(archive_name, "w:gz") as tar_file:
+            for name in ARCHIVE_SOURCES:
+                tar_file.add(name)
+    ipynb_creator.main_with_files([archive_name],
+            {"output_archive": "out.zip"})
+    assert "Converted 2 of 2 files into out.zip. 0 failed." in (
+            capsys.readouterr().out)
+    with zipfile.ZipFile("out.zip") as zip_file:
+        assert {name: zip_file.read(name)
+                for name in zip_file.namelist()} == expected
+
+
+def test_archive_include_is_an_error(tmp_path, monkeypatch, capsys):
+    import zipfile
+    monkeypatch.chdir(tmp_path)
+    with zipfile.ZipFile("in.zip", "w") as zip_file:
+        zip_file.writestr("bad.txt", "<code>\n<include part.py>\n")
+        zip_file.writestr("good.txt", "<code>\nprint(1)\n")
+    with pytest.raises(SystemExit) as exc_info:
+        ipynb_creator.main_with_files(["in.zip"], {"output_dir": "out"})
+    assert exc_info.value.code == 1
+    assert ("Error converting in.zip:bad.txt: ValueError: <include part.py> "
+            "can not be used in a file read from an archive") in (
+            capsys.readouterr().err)
+    assert os.listdir("out") == ["good.ipynb"]
+
+
+def test_update_keeps_outputs_of_unchanged_cells(tmp_path, monkeypatch,
+        capsys):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "a.txt").write_text("<code>\nprint(1)\n<markdown>\n# Notes\n"
+            "<code>\nprint(2)\n")
+    ipynb_creator.main_with_files(["a.txt"])
+    data = json.loads((tmp_path / "a.ipynb").read_text())
+    output = {"output_type": "stream", "name": "stdout", "text": ["1\n"]}
+    for number, cell in enumerate(data["cells"], 1):
+        if cell["cell_type"] == "code":
+            cell["execution_count"] = number
+            cell["outputs"] = [output]
+        cell["metadata"]["tags"] = ["kept"]
+    (tmp_path / "a.ipynb").write_text(json.dumps(data))
+    (tmp_path / "a.txt").write_text("<code>\nprint(1)\n<markdown>\n# Notes\n"
+            "<code>\nprint(22)\n")
+    capsys.readouterr()
+    ipynb_creator.main_with_files(["a.txt"], {"update": True})
+    assert "Unchanged cells kept from a.ipynb: 2 of 3" in (
+            capsys.readouterr().out)
+    first, notes, changed = json.loads(
+            (tmp_path / "a.ipynb").read_text())["cells"]
+    assert first["execution_count"] == 1
+    assert first["outputs"] == [output]
+    assert first["metadata"]["tags"] == ["kept"]
+    assert notes["metadata"]["tags"] == ["kept"]
+    assert changed["execution_count"] is None
+    assert changed["outputs"] == []
+    assert "tags" not in changed["metadata"]
+    assert "".join(changed["source"]).strip() == "print(22)"
+
+
+def test_update_without_a_notebook_writes_it(tmp_path, monkeypatch):
+    # With no existing ipynb file --update writes the usual notebook
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "a.txt").write_text("<code>\nprint(1)\n")
+    ipynb_creator.main_with_files(["a.txt"])
+    expected = (tmp_path / "a.ipynb").read_bytes()
+    os.remove("a.ipynb")
+    ipynb_creator.main_with_files(["a.txt"], {"update": True})
+    assert (tmp_path / "a.ipynb").read_bytes() == expected
+
+
+def test_watch_with_recursive_is_an_option_error(monkeypatch):
+    monkeypatch.setattr("sys.argv", ["ipynb-creator.py", "--recursive",
+            "--watch"])
+    with pytest.raises(SystemExit) as exc_info:
+        ipynb_creator.main()
+    assert exc_info.value.code == "--watch can not be used with --recursive."